@@ -0,0 +1,135 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Process-wide cache of answers keyed by the meaning of the standalone question.
+
+    A lookup embeds the (rewritten) question and returns the answer of the most
+    similar cached question if its cosine similarity is at least threshold.
+    Entries expire after ttl_seconds, the least recently used entry is evicted
+    once max_entries is reached, and everything is dropped when corpus_version()
+    changes (i.e. the ingestion manifest changed).
+    """
+
+    def __init__(self, embeddings, threshold: float = 0.92, ttl_seconds: int = 24 * 3600,
+                 max_entries: int = 5000, corpus_version: Optional[Callable[[], str]] = None,
+                 version_check_seconds: int = 60):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.corpus_version = corpus_version
+        self.version_check_seconds = version_check_seconds
+
+        self._entries = OrderedDict()  # key -> (question, answer, created_at)
+        self._vectors = {}  # key -> normalized question embedding
+        self._keys = []
+        self._matrix = None
+        self._next_key = 0
+        self._version = corpus_version() if corpus_version else None
+        self._version_checked_at = time.time()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.hit_similarities = []
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question.strip()), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self):
+        if not self.corpus_version or time.time() - self._version_checked_at < self.version_check_seconds:
+            return
+        self._version_checked_at = time.time()
+        version = self.corpus_version()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self._vectors.clear()
+            self._matrix = None
+            self.invalidations += 1
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        self._vectors.pop(key, None)
+        self._matrix = None
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Return a cached answer for a near-duplicate question, or None"""
+        vector = self._embed(question)
+        with self._lock:
+            self._check_version()
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._keys = list(self._vectors)
+                self._matrix = np.stack([self._vectors[key] for key in self._keys])
+            scores = self._matrix @ vector
+            best = int(np.argmax(scores))
+            key, similarity = self._keys[best], float(scores[best])
+
+            if similarity < self.threshold:
+                self.misses += 1
+                if similarity >= self.threshold - 0.05:
+                    self.near_misses += 1
+                return None
+            _, answer, created_at = self._entries[key]
+            if time.time() - created_at > self.ttl_seconds:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.hit_similarities.append(similarity)
+            del self.hit_similarities[:-1000]
+            return answer
+
+    def add(self, question: str, answer: str):
+        vector = self._embed(question)
+        with self._lock:
+            self._check_version()
+            while len(self._entries) >= self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = (question, answer, time.time())
+            self._vectors[key] = vector
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            self._matrix = None
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "near_misses": self.near_misses,
+            "mean_hit_similarity": float(np.mean(self.hit_similarities)) if self.hit_similarities else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "threshold": self.threshold,
+        }
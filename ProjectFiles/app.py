@@ -1,73 +1,115 @@
 import streamlit as st
 import uuid
 import os
+import time
+import itertools
+import threading
 import warnings
+from collections import deque
 from langchain_core._api.deprecation import LangChainDeprecationWarning
 warnings.filterwarnings("ignore", category=LangChainDeprecationWarning)
 from dotenv import load_dotenv
 
 # --- Core LangChain components ---
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import SQLChatMessageHistory
 
-import base64
 from pinecone import Pinecone
 from PIL import Image
 
 # Import system template and auth components
-from system_template import SYSTEM_TEMPLATE
 from auth import AuthManager
-from database import DatabaseManager
+from embedding_cache import CachedEmbeddings
+from onnx_embeddings import cache_model_name, create_embeddings
+from local_index import LocalVectorStore, LOCAL_INDEX_PATH
+from keyword_index import HybridRetriever, KeywordIndex
+from answer_cache import SemanticAnswerCache
+from manifest import IngestionManifest
+from rag_chain import build_rag_chain, stream_answer
+from history_window import HistoryWindow
+from history_pages import HistoryPager
+from assets import image_url
+from chat_history_store import HistoryFactory, create_history_engine
+from database import RetentionJob, get_database
 
 # ---------------- Load Environment Variables ---------------------------
 load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 INDEX_NAME = "langchain-pinecone-demo"
+# "pinecone" (default) or "local" to search the index built by pinecone_utils.py in-process
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+# "hybrid" (BM25 + dense, fused with RRF) or "dense"
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+# "torch", "onnx" or "onnx-int8" (ONNX Runtime, no PyTorch in the Streamlit process)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Build models and chains in the background at server start instead of on the first message
+EAGER_WARMUP = os.getenv("EAGER_WARMUP", "1") == "1"
+# Semantic answer cache for repeated questions
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+# "skip" (default): no rewrite LLM call for questions that are already standalone,
+# "parallel": also retrieve on a guessed rewrite while the rewrite runs, "always": old behaviour
+QUESTION_REWRITE = os.getenv("QUESTION_REWRITE", "skip").lower()
+# Prompt history: last HISTORY_MAX_TURNS turns verbatim (within HISTORY_MAX_TOKENS), older turns summarized
+HISTORY_WINDOW = os.getenv("HISTORY_WINDOW", "1") == "1"
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "6"))
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "1500"))
+# Messages rendered per page of chat history
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+# Delete sessions not accessed for RETENTION_DAYS days in the background (0 = keep forever)
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "24"))
+# Move messages older than ARCHIVE_AFTER_DAYS days to the compressed archive table (0 = off)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+# Comma-separated emails that see the query analytics dashboard in the sidebar
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
 
-if not PINECONE_API_KEY or not OPENAI_API_KEY:
+if (VECTOR_BACKEND != "local" and not PINECONE_API_KEY) or not OPENAI_API_KEY:
     st.error("❌ API key not found. Set PINECONE_API_KEY and OPENAI_API_KEY in your .env file")
     st.stop()
 
 # Database and Auth Setup
 if "db_manager" not in st.session_state:
-    st.session_state.db_manager = DatabaseManager()
+    st.session_state.db_manager = get_database()
 if "auth_manager" not in st.session_state:
     st.session_state.auth_manager = AuthManager()
 
+@st.cache_resource(show_spinner=False)
+def get_history_factory():
+    """Chat histories share one pooled engine per process and are reused per session"""
+    return HistoryFactory(create_history_engine("users.db"))
+
 def get_session_history(session_id: str):
     """Get chat history for a session"""
-    return SQLChatMessageHistory(
-        session_id=session_id,
-        table_name="chat_history",
-        connection_string="sqlite:///users.db"
-    )
+    return get_history_factory()(session_id)
+
+def get_history_pager(session_id: str):
+    """Deserialized recent history for this browser session, topped up with new rows on each rerun"""
+    pager = st.session_state.get("history_pager")
+    if pager is None or pager.session_id != session_id:
+        pager = HistoryPager(st.session_state.db_manager, session_id, page_size=HISTORY_PAGE_SIZE)
+        st.session_state.history_pager = pager
+    else:
+        pager.refresh()
+    return pager
 
 # ----------------- Helper function for bot page styling ------------------
-def set_bot_background_and_styling():
-    """Set background image and custom styling for bot interface"""
+@st.cache_resource(show_spinner=False)
+def bot_page_css():
+    """Bot page <style> block, built once per process"""
     # Try to load background image
-    background_style = ""
-    if os.path.exists("background.jpg"):
-        try:
-            with open("background.jpg", "rb") as f:
-                img_data = f.read()
-            b64_encoded = base64.b64encode(img_data).decode()
-            background_style = f"""
-                background-image: linear-gradient(rgba(0,0,0,0.6), rgba(0,0,0,0.6)), url(data:image/jpeg;base64,{b64_encoded});
-                background-size: cover;
-                background-position: center;
-                background-repeat: no-repeat;
-                background-attachment: fixed;
-            """
-        except:
-            background_style = "background: linear-gradient(135deg, #1e3c72 0%, #2a5298 100%);"
+    background_url = image_url("background.jpg", max_width=1920)
+    if background_url:
+        background_style = f"""
+            background-image: linear-gradient(rgba(0,0,0,0.6), rgba(0,0,0,0.6)), url({background_url});
+            background-size: cover;
+            background-position: center;
+            background-repeat: no-repeat;
+            background-attachment: fixed;
+        """
     else:
         background_style = "background: linear-gradient(135deg, #1e3c72 0%, #2a5298 100%);"
     
@@ -122,7 +164,11 @@ def set_bot_background_and_styling():
         }}
         </style>
     """
-    st.markdown(style, unsafe_allow_html=True)
+    return style
+
+def set_bot_background_and_styling():
+    """Set background image and custom styling for bot interface"""
+    st.markdown(bot_page_css(), unsafe_allow_html=True)
 
 # ----------------- Lazy Loading Functions -------------------------------------
 
@@ -135,10 +181,11 @@ def get_pinecone_client():
 def load_embeddings():
     """Load embeddings with caching and faster model - only when needed"""
     # Use a faster, smaller model for better performance
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True, 'batch_size': 32}
+    model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    embeddings = create_embeddings(EMBEDDING_BACKEND, model_name=model_name, normalize=True, batch_size=32)
+    # Repeated questions are served from the on-disk embedding cache
+    return CachedEmbeddings(
+        embeddings, model_name=cache_model_name(EMBEDDING_BACKEND, model_name), normalize=True
     )
 
 @st.cache_resource(show_spinner=False)
@@ -156,11 +203,41 @@ def get_chat_model():
 def setup_vector_store():
     """Setup vector store with caching - only when needed"""
     embeddings = load_embeddings()
+    if VECTOR_BACKEND == "local":
+        return LocalVectorStore.from_existing_index(
+            embedding=embeddings,
+            path=LOCAL_INDEX_PATH,
+            quantization=os.getenv("LOCAL_INDEX_QUANTIZATION", "none"),
+        )
     return PineconeVectorStore.from_existing_index(
         embedding=embeddings, 
         index_name=INDEX_NAME
     )
 
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    """Process-wide semantic answer cache, invalidated when the ingestion manifest changes"""
+    if VECTOR_BACKEND == "local":
+        manifest = IngestionManifest(os.path.join(LOCAL_INDEX_PATH, "manifest.sqlite"))
+    else:
+        manifest = IngestionManifest()
+    return SemanticAnswerCache(
+        load_embeddings(),
+        threshold=ANSWER_CACHE_THRESHOLD,
+        ttl_seconds=ANSWER_CACHE_TTL,
+        corpus_version=manifest.version,
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_history_window():
+    """Rolling-summary history window shared by all sessions"""
+    return HistoryWindow(
+        get_chat_model(),
+        get_database(),
+        max_turns=HISTORY_MAX_TURNS,
+        max_tokens=HISTORY_MAX_TOKENS,
+    )
+
 @st.cache_resource(show_spinner=False)
 def setup_rag_chain():
     """Setup complete RAG chain with caching - only when user sends first message"""
@@ -168,53 +245,131 @@ def setup_rag_chain():
         # Load components silently
         chat = get_chat_model()
         vector_store = setup_vector_store()
-        retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-        
-        # Create contextualize question prompt
-        contextualize_q_system_prompt = """Given a chat history and the latest user question \
-which might reference context in the chat history, formulate a standalone question \
-which can be understood without the chat history. Do NOT answer the question, \
-just reformulate it if needed and otherwise return it as is."""
-        
-        contextualize_q_prompt = ChatPromptTemplate.from_messages([
-            ("system", contextualize_q_system_prompt),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}"),
-        ])
+        if RETRIEVAL_MODE == "hybrid":
+            # Exact identifiers (course codes, fees, rooms) are caught by BM25
+            retriever = HybridRetriever(vector_store=vector_store, keyword_index=KeywordIndex(), k=3)
+        else:
+            retriever = vector_store.as_retriever(search_kwargs={"k": 3})
         
-        # Create history-aware retriever
-        history_aware_retriever = create_history_aware_retriever(
-            chat, retriever, contextualize_q_prompt
+        return build_rag_chain(
+            chat,
+            retriever,
+            answer_cache=get_answer_cache() if ANSWER_CACHE else None,
+            rewrite_mode=QUESTION_REWRITE,
+            embeddings=load_embeddings(),
+            history_window=get_history_window() if HISTORY_WINDOW else None,
         )
         
-        # Modify the system template
-        modified_system_template = SYSTEM_TEMPLATE.replace(
-            "- Legal Disclaimer",
-            "❖ Legal Disclaimer"
-        ).replace(
-            "{context}",
-            "*Context from retrieved documents:*\n{context}"
-        )
-        
-        # Create QA prompt
-        qa_prompt = ChatPromptTemplate.from_messages([
-            ("system", modified_system_template),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}"),
-        ])
-        
-        # Create document chain
-        question_answer_chain = create_stuff_documents_chain(chat, qa_prompt)
-        
-        # Create RAG chain
-        rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
-        
-        return rag_chain
-        
     except Exception as e:
         return None
 
+# ----------------- Eager Warm-up ---------------------------------------------
+def _timed(timings, name, fn):
+    """Run fn and record its wall time in milliseconds"""
+    start = time.perf_counter()
+    result = fn()
+    timings[name] = (time.perf_counter() - start) * 1000
+    return result
+
+def run_warmup(report):
+    """Build the cached resources, embed a dummy query and touch the index"""
+    started = time.perf_counter()
+    try:
+        cold = report["cold"]
+        embeddings = _timed(cold, "load_embeddings", load_embeddings)
+        _timed(cold, "get_chat_model", get_chat_model)
+        vector_store = _timed(cold, "setup_vector_store", setup_vector_store)
+        _timed(cold, "setup_rag_chain", setup_rag_chain)
+        _timed(cold, "prepare_assets", lambda: (bot_page_css(), image_url("college_logo.jpg", max_width=1200)))
+        _timed(cold, "embed_query", lambda: embeddings.embed_query("warm-up: admission process"))
+        _timed(cold, "index_query", lambda: vector_store.similarity_search("admission process", k=1))
+        
+        # Same calls again: what a request costs once everything is resident
+        warm = report["warm"]
+        _timed(warm, "setup_rag_chain", setup_rag_chain)
+        _timed(warm, "embed_query", lambda: embeddings.embed_query("warm-up: hostel fees"))
+        _timed(warm, "index_query", lambda: vector_store.similarity_search("hostel fees", k=1))
+    except Exception as e:
+        report["error"] = str(e)
+    report["total_ms"] = (time.perf_counter() - started) * 1000
+    report["done"] = True
+    
+    cold_ms = ", ".join(f"{k}={v:.0f}ms" for k, v in report["cold"].items())
+    warm_ms = ", ".join(f"{k}={v:.1f}ms" for k, v in report["warm"].items())
+    print(f"🔥 Warm-up finished in {report['total_ms']:.0f}ms | cold: {cold_ms} | warm: {warm_ms}")
+    if "error" in report:
+        print(f"⚠ Warm-up error: {report['error']}")
+
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    """Start the warm-up thread once per server process; returns its live report"""
+    report = {"cold": {}, "warm": {}, "done": False}
+    thread = threading.Thread(target=run_warmup, args=(report,), name="rag-warmup", daemon=True)
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+        add_script_run_ctx(thread)
+    except ImportError:
+        pass
+    thread.start()
+    return report
+
+@st.cache_resource(show_spinner=False)
+def start_retention_job():
+    """Start the retention cleanup / archiving thread once per server process"""
+    return RetentionJob(
+        get_database(),
+        days=RETENTION_DAYS,
+        interval_hours=RETENTION_INTERVAL_HOURS,
+        archive_days=ARCHIVE_AFTER_DAYS,
+    ).start()
+
 # ----------------- Authentication Functions ---------------------------------
+def record_turn_analytics(prompt: str, answer: str, response: dict, timings: dict):
+    """Log the finished turn for the analytics dashboard"""
+    try:
+        chat = get_chat_model()
+        question_tokens, answer_tokens = chat.get_num_tokens(prompt), chat.get_num_tokens(answer)
+    except Exception:
+        question_tokens, answer_tokens = len(prompt) // 4, len(answer) // 4
+    st.session_state.db_manager.record_query_event(
+        st.session_state.get("user_id"),
+        prompt,
+        latency_ms=timings.get("total_ms", 0.0),
+        ttft_ms=timings.get("ttft_ms"),
+        cache_hit=bool(response.get("cache_hit")),
+        question_tokens=question_tokens,
+        history_tokens=timings.get("history_tokens", 0),
+        answer_tokens=answer_tokens,
+    )
+
+def show_analytics_dashboard():
+    """Usage and popular questions for admins, served from the pre-aggregated rollups"""
+    stats = st.session_state.db_manager.get_analytics_dashboard(hours=24, days=30, top_k=10)
+    last_day = stats["hourly"]
+    col1, col2 = st.columns(2)
+    col1.metric("Questions (24h)", sum(row["questions"] for row in last_day))
+    col2.metric("Questions (30d)", stats["questions"])
+    col1.metric("Cache hit rate", f"{stats['cache_hit_rate']:.0%}")
+    col2.metric("Avg latency", f"{stats['avg_latency_ms'] / 1000:.1f}s")
+    if stats["daily"]:
+        st.bar_chart({row["bucket"]: row["questions"] for row in stats["daily"]})
+    st.markdown("**Popular questions**")
+    for question, count, _ in stats["popular"]:
+        st.markdown(f"- {question} ({count})")
+    
+    if ANSWER_CACHE:
+        # Live counters of this process's semantic cache, for tuning ANSWER_CACHE_THRESHOLD
+        cache_stats = get_answer_cache().stats()
+        st.markdown("**Answer cache (this process)**")
+        col1, col2 = st.columns(2)
+        col1.metric("Entries", cache_stats["entries"])
+        col2.metric("Hit rate", f"{cache_stats['hit_rate']:.0%}")
+        col1.metric("Near misses", cache_stats["near_misses"])
+        mean_similarity = cache_stats["mean_hit_similarity"]
+        col2.metric("Mean hit similarity", f"{mean_similarity:.3f}" if mean_similarity is not None else "–")
+        st.caption(f"threshold {cache_stats['threshold']} · {cache_stats['evictions']} evicted · "
+                   f"{cache_stats['expirations']} expired · {cache_stats['invalidations']} invalidated")
+
 def check_authentication():
     """Check if user is authenticated"""
     return "user_id" in st.session_state and st.session_state.user_id is not None
@@ -262,6 +417,18 @@ def show_user_profile_sidebar():
     
     st.markdown("---")
     
+    # Full-text search over this user's chats
+    search_query = st.text_input("🔎 Search your chats", key="chat_search", placeholder="e.g. hostel fees")
+    if search_query.strip():
+        results = st.session_state.db_manager.search_chat_history(user_id, search_query, limit=10)
+        if results:
+            for _, _, role, snippet in results:
+                st.markdown(f"{'🧑‍⚖️' if role == 'human' else '🤖'} {snippet}")
+        else:
+            st.caption("No matching messages")
+    
+    st.markdown("---")
+    
     # Simple action buttons - no session management UI
     if st.button("📝 Delete Chat", key="new_chat_btn", use_container_width=True):
         # Clear current chat history but keep same session
@@ -269,6 +436,8 @@ def show_user_profile_sidebar():
         if session_id:
             history = get_session_history(session_id)
             history.clear()
+            get_history_window().clear(session_id)
+            st.session_state.pop("history_pager", None)
         st.rerun()
     
     st.markdown("---")
@@ -284,6 +453,11 @@ def show_user_profile_sidebar():
     
     st.markdown("---")
     
+    if st.session_state.get("user_email", "").lower() in ADMIN_EMAILS:
+        with st.expander("📊 Analytics"):
+            show_analytics_dashboard()
+        st.markdown("---")
+    
     # Additional info
     st.markdown("### ℹ️ About")
     st.markdown("** Campus Knowledge Engine is your AI-powered campus guide. Ask any question about admissions, courses, faculty, facilities, placements, or student life, and get comprehensive answers tailored to your college.**")
@@ -335,11 +509,16 @@ def show_legalbot_interface():
             st.session_state.db_manager.update_session_access_time(st.session_state.user_id, session_id)
             
             # Load and display chat history immediately - no waiting for AI components
-            history = get_session_history(session_id)
+            pager = get_history_pager(session_id)
+            
+            if pager.has_older:
+                if st.button("⬆️ Load older messages", key="load_older_btn"):
+                    pager.load_older()
+                    st.rerun()
             
             # Convert LangChain messages to displayable format
-            if hasattr(history, 'messages') and history.messages:
-                for message in history.messages:
+            if pager.rows:
+                for message in pager.messages:
                     role = "user" if message.type == "human" else "assistant"
                     avatar = "🧑‍⚖️" if role == "user" else "🤖"
                     with st.chat_message(role, avatar=avatar):
@@ -361,44 +540,66 @@ def show_legalbot_interface():
                 
                 # Generate and display assistant response
                 with st.chat_message("assistant", avatar="🤖"):
-                    with st.spinner("🔍 Searching legal documents and generating response..."):
-                        try:
+                    try:
+                        with st.spinner("🔍 Searching legal documents and generating response..."):
                             # Get RAG chain only when user sends message - truly lazy loading
                             rag_chain = setup_rag_chain()
+                        
+                        if rag_chain is not None:
+                            # Create conversational RAG chain with message history
+                            conversational_rag_chain = RunnableWithMessageHistory(
+                                rag_chain,
+                                get_session_history,
+                                input_messages_key="input",
+                                history_messages_key="chat_history",
+                                output_messages_key="answer",
+                            )
                             
-                            if rag_chain is not None:
-                                # Create conversational RAG chain with message history
-                                conversational_rag_chain = RunnableWithMessageHistory(
-                                    rag_chain,
-                                    get_session_history,
-                                    input_messages_key="input",
-                                    history_messages_key="chat_history",
-                                    output_messages_key="answer",
-                                )
-                                
-                                # Get response from RAG chain
-                                response = conversational_rag_chain.invoke(
-                                    {"input": prompt},
-                                    config={
-                                        "configurable": {"session_id": session_id}
-                                    },
-                                )
-                                
-                                # Extract and display the answer
-                                answer = response.get("answer", "Sorry, I couldn't generate a response.")
+                            # Stream the answer; history is written when the stream completes
+                            response, timings = {}, {}
+                            tokens = stream_answer(
+                                conversational_rag_chain,
+                                {"input": prompt},
+                                config={"configurable": {"session_id": session_id}},
+                                output=response,
+                                timings=timings,
+                            )
+                            with st.spinner("🔍 Searching legal documents and generating response..."):
+                                # Only the wait for the first token is spent behind the spinner
+                                first_token = next(tokens, "")
+                            answer = st.write_stream(itertools.chain([first_token], tokens))
+                            if not answer:
+                                answer = "Sorry, I couldn't generate a response."
                                 st.markdown(answer)
-                            else:
-                                st.error("Failed to initialize AI components. Please try again.")
-                                
-                        except Exception as e:
-                            error_message = f"An error occurred: {str(e)}"
-                            st.error(error_message)
+                            
+                            if "history_tokens" in response:
+                                timings["history_tokens_full"], timings["history_tokens"] = response["history_tokens"]
+                            # Recent turns only; the full record is in the query analytics tables
+                            st.session_state.setdefault("turn_timings", deque(maxlen=50)).append(timings)
+                            record_turn_analytics(prompt, answer, response, timings)
+                            
+                            # Only answers generated without this user's history (see build_rag_chain)
+                            cacheable = response.get("cacheable") and not response.get("cache_hit")
+                            if ANSWER_CACHE and cacheable and "answer" in response:
+                                get_answer_cache().add(response["standalone_question"], answer)
+                        else:
+                            st.error("Failed to initialize AI components. Please try again.")
+                            
+                    except Exception as e:
+                        error_message = f"An error occurred: {str(e)}"
+                        st.error(error_message)
 
 # ----------------- Main App Logic ---------------------------------
 def main():
     """Main application logic"""
+    if EAGER_WARMUP:
+        # Non-blocking: the login page renders while models load in the background
+        start_warmup()
+    if RETENTION_DAYS > 0 or ARCHIVE_AFTER_DAYS > 0:
+        start_retention_job()
+    
     if not check_authentication():
-        # Show login page - no pre-loading here
+        # Show login page
         st.session_state.auth_manager.show_auth_page()
     else:
         # User is authenticated, show bot interface immediately
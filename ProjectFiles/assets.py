@@ -0,0 +1,61 @@
+import os
+import base64
+import hashlib
+from io import BytesIO
+from typing import Optional
+
+import streamlit as st
+from PIL import Image
+
+# Served at app/static/ when server.enableStaticServing is on (see .streamlit/config.toml)
+STATIC_DIR = "static"
+
+
+def optimize_image(path: str, max_width: int, quality: int = 80) -> bytes:
+    """Downscale to max_width and re-encode as a progressive JPEG"""
+    image = Image.open(path).convert("RGB")
+    if image.width > max_width:
+        height = round(image.height * max_width / image.width)
+        image = image.resize((max_width, height), Image.Resampling.LANCZOS)
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buffered.getvalue()
+
+
+def _static_serving() -> bool:
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+@st.cache_resource(show_spinner=False)
+def image_url(path: str, max_width: int = 1920, quality: int = 80) -> Optional[str]:
+    """URL of an optimized copy of an image, prepared once per process.
+
+    With static serving the copy is written to static/ under a content-hashed
+    name, so browsers cache it and reruns only resend the URL; otherwise a
+    data URL is returned.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        data = optimize_image(path, max_width, quality)
+    except Exception as e:
+        print(f"❌ Could not prepare asset {path}: {e}")
+        return None
+
+    original_kb, optimized_kb = os.path.getsize(path) / 1024, len(data) / 1024
+    if _static_serving():
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}.jpg"
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        target = os.path.join(STATIC_DIR, name)
+        if not os.path.exists(target):
+            with open(target, "wb") as f:
+                f.write(data)
+        print(f"✅ Asset {path}: {original_kb:.0f} KB -> {optimized_kb:.0f} KB, served as app/static/{name}")
+        return f"app/static/{name}"
+
+    print(f"✅ Asset {path}: {original_kb:.0f} KB -> {optimized_kb:.0f} KB, inlined as data URL")
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode()
@@ -1,15 +1,13 @@
 import streamlit as st
 import hashlib
-import os
-from database import DatabaseManager
-from PIL import Image
-import base64
-from io import BytesIO
+from database import get_database
+from image_store import encode_profile_picture, thumbnail_cache
+from assets import image_url
 
 class AuthManager:
     def __init__(self):
-        self.db = DatabaseManager()
-        self.db.create_tables()
+        # Shared handle: the schema was set up when the process first opened it
+        self.db = get_database()
     
     def hash_password(self, password):
         """Hash password using SHA-256"""
@@ -242,16 +240,13 @@ class AuthManager:
         with col_img:
             st.markdown('<div class="legal-image-container">', unsafe_allow_html=True)
             
-            # Try to load the college_logo.jpg
-            if os.path.exists("college_logo.jpg"):
+            # Try to load the college_logo.jpg (optimized once per process)
+            logo_url = image_url("college_logo.jpg", max_width=1200)
+            if logo_url:
                 try:
                 # --- CHANGE: Using HTML to control both width and height ---
-                    import base64
-                    with open("college_logo.jpg", "rb") as img_file:
-                        img_data = base64.b64encode(img_file.read()).decode()
-                    
                     st.markdown(f"""
-                        <img src="data:image/jpeg;base64,{img_data}" 
+                        <img src="{logo_url}" 
                             style="width: 776px; height: 450px; object-fit: cover; border-radius: 15px; box-shadow: 0 10px 30px rgba(0, 0, 0, 0.3);" 
                             alt="Legal System">
                     """, unsafe_allow_html=True)
@@ -458,13 +453,8 @@ class AuthManager:
                     profile_pic_data = None
                     if uploaded_file is not None:
                         try:
-                            # Convert image to base64
-                            image = Image.open(uploaded_file)
-                            # Resize image to reasonable size
-                            image.thumbnail((300, 300), Image.Resampling.LANCZOS)
-                            buffered = BytesIO()
-                            image.save(buffered, format="PNG")
-                            profile_pic_data = base64.b64encode(buffered.getvalue()).decode()
+                            # Resize image to reasonable size and store it as PNG bytes
+                            profile_pic_data = encode_profile_picture(uploaded_file)
                         except Exception as e:
                             st.error(f"Error processing profile picture: {str(e)}")
                             return
@@ -488,17 +478,11 @@ class AuthManager:
         hashed_password = self.hash_password(password)
         return self.db.create_user(first_name, last_name, email, hashed_password, profile_pic_data)
     
-    def get_user_profile_picture(self, user_id):
-        """Get user's profile picture"""
-        profile_pic_data = self.db.get_user_profile_picture(user_id)
-        if profile_pic_data:
-            try:
-                # Convert base64 back to image
-                image_data = base64.b64decode(profile_pic_data)
-                image = Image.open(BytesIO(image_data))
-                return image
-            except:
-                return None
+    def get_user_profile_picture(self, user_id, width=150):
+        """Get user's profile picture as cached PNG thumbnail bytes"""
+        image_hash = self.db.get_user_profile_picture(user_id)
+        if image_hash:
+            return thumbnail_cache.get(image_hash, width, self.db.get_image)
         return None
     
     def show_profile_page(self, user_id):
@@ -508,7 +492,7 @@ class AuthManager:
             st.error("User not found")
             return
         
-        user_id, first_name, last_name, email, created_at, profile_pic_data = user_info
+        user_id, first_name, last_name, email, created_at, profile_pic_hash = user_info
         
         st.title("👤 User Profile")
         
@@ -516,13 +500,9 @@ class AuthManager:
         
         with col1:
             # Display profile picture
-            if profile_pic_data:
-                try:
-                    image_data = base64.b64decode(profile_pic_data)
-                    image = Image.open(BytesIO(image_data))
-                    st.image(image, width=200, caption="Profile Picture")
-                except:
-                    self._show_default_avatar(first_name[0] if first_name else "U")
+            thumbnail = thumbnail_cache.get(profile_pic_hash, 200, self.db.get_image) if profile_pic_hash else None
+            if thumbnail:
+                st.image(thumbnail, width=200, caption="Profile Picture")
             else:
                 self._show_default_avatar(first_name[0] if first_name else "U")
             
@@ -536,11 +516,7 @@ class AuthManager:
             
             if new_pic and st.button("Update Picture"):
                 try:
-                    image = Image.open(new_pic)
-                    image.thumbnail((300, 300), Image.Resampling.LANCZOS)
-                    buffered = BytesIO()
-                    image.save(buffered, format="PNG")
-                    new_pic_data = base64.b64encode(buffered.getvalue()).decode()
+                    new_pic_data = encode_profile_picture(new_pic)
                     
                     if self.db.update_profile_picture(user_id, new_pic_data):
                         st.success("Profile picture updated successfully!")
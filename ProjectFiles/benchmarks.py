@@ -0,0 +1,539 @@
+"""Ad-hoc performance benchmarks.
+
+Usage:
+    python benchmarks.py retrieval [--rounds N]
+    python benchmarks.py quantization [--k K]
+    python benchmarks.py hybrid [--rounds N]
+    python benchmarks.py embeddings [--rounds N]
+    python benchmarks.py rewrite [--rounds N]
+    python benchmarks.py history
+    python benchmarks.py database [--sessions N] [--ops N]
+    python benchmarks.py chat-history [--sessions N] [--rounds N]
+    python benchmarks.py analytics [--ops N] [--rounds N]
+    python benchmarks.py archive [--sessions N] [--ops N] [--rounds N]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+
+SAMPLE_QUERIES = [
+    "What is the admission process for B.Tech?",
+    "What are the hostel fees per year?",
+    "Which companies visited for campus placements?",
+    "What are the library timings?",
+    "Who is the head of the computer science department?",
+    "What scholarships are available for students?",
+    "When does the academic year start?",
+    "What is the eligibility criteria for MBA admission?",
+    "Is there transport facility for day scholars?",
+    "What clubs and student activities are available?",
+]
+
+INDEX_NAME = "langchain-pinecone-demo"
+
+
+# ----------- Helpers -----------
+def time_calls(fn, args_list, rounds: int = 1):
+    """Call fn(*args) for every args in args_list, rounds times; return per-call latencies in ms"""
+    latencies = []
+    for _ in range(rounds):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(name: str, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"  {name:<28} mean {statistics.mean(ordered):8.2f} ms | "
+          f"p50 {statistics.median(ordered):8.2f} ms | p95 {p95:8.2f} ms | n={len(ordered)}")
+
+
+def load_query_embeddings():
+    from onnx_embeddings import create_embeddings
+
+    return create_embeddings(os.getenv("EMBEDDING_BACKEND", "torch").lower(), normalize=True)
+
+
+def load_vector_store(embeddings):
+    if os.getenv("VECTOR_BACKEND", "pinecone").lower() == "local":
+        from local_index import LocalVectorStore, LOCAL_INDEX_PATH
+        return LocalVectorStore.from_existing_index(embedding=embeddings, path=LOCAL_INDEX_PATH)
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore.from_existing_index(embedding=embeddings, index_name=INDEX_NAME)
+
+
+def load_retriever(embeddings):
+    """Same retriever the app builds for the configured backend and RETRIEVAL_MODE"""
+    from keyword_index import HybridRetriever, KeywordIndex
+
+    vector_store = load_vector_store(embeddings)
+    if os.getenv("RETRIEVAL_MODE", "hybrid").lower() == "hybrid":
+        return HybridRetriever(vector_store=vector_store, keyword_index=KeywordIndex(), k=3)
+    return vector_store.as_retriever(search_kwargs={"k": 3})
+
+
+# ----------- Benchmarks -----------
+def bench_retrieval(args):
+    """Compare Pinecone and local index retrieval latency (k=3)"""
+    embeddings = load_query_embeddings()
+    query_vectors = [embeddings.embed_query(q) for q in SAMPLE_QUERIES]
+    print(f"Retrieval latency over {len(SAMPLE_QUERIES)} queries x {args.rounds} rounds (k=3)")
+
+    summarize("embed query", time_calls(embeddings.embed_query, [(q,) for q in SAMPLE_QUERIES], args.rounds))
+
+    from local_index import LocalVectorStore, LOCAL_INDEX_PATH
+    local = LocalVectorStore.from_existing_index(embedding=embeddings, path=LOCAL_INDEX_PATH)
+    if len(local.index):
+        vector_args = [(v, 3) for v in query_vectors]
+        summarize(f"local ivf ({len(local.index)} vecs)",
+                  time_calls(local.similarity_search_by_vector, vector_args, args.rounds))
+        summarize("local exact",
+                  time_calls(lambda v, k: local.index.search(v, k, exact=True), vector_args, args.rounds))
+    else:
+        print(f"  local: no index at '{LOCAL_INDEX_PATH}' (run VECTOR_BACKEND=local python pinecone_utils.py)")
+
+    if os.getenv("PINECONE_API_KEY"):
+        from langchain_pinecone import PineconeVectorStore
+
+        remote = PineconeVectorStore.from_existing_index(embedding=embeddings, index_name=INDEX_NAME)
+        summarize("pinecone",
+                  time_calls(remote.similarity_search_by_vector, [(v, 3) for v in query_vectors], args.rounds))
+    else:
+        print("  pinecone: skipped (PINECONE_API_KEY not set)")
+
+
+def bench_quantization(args):
+    """Recall@k and latency of int8 / binary quantized search against the float32 baseline"""
+    import random
+    from local_index import LocalVectorIndex, LOCAL_INDEX_PATH, QUANTIZATION_MODES
+
+    index = LocalVectorIndex.load(LOCAL_INDEX_PATH)
+    if not len(index):
+        print(f"No local index at '{LOCAL_INDEX_PATH}' (run VECTOR_BACKEND=local python pinecone_utils.py)")
+        return 1
+
+    # Real campus questions plus partial chunk texts, as users often paste fragments
+    embeddings = load_query_embeddings()
+    random.seed(0)
+    fragments = [index.texts[row][:80] for row in random.sample(range(len(index)), min(100, len(index)))]
+    queries = SAMPLE_QUERIES + fragments
+    query_vectors = embeddings.embed_documents(queries)
+    truth = [{row for row, _ in index.search(v, args.k, exact=True)} for v in query_vectors]
+
+    def recall():
+        results = [index.search(v, args.k) for v in query_vectors]
+        return statistics.mean(
+            len(expected & {row for row, _ in got}) / len(expected) for expected, got in zip(truth, results)
+        )
+
+    print(f"Quantized search on {len(index)} vectors, {len(queries)} queries, k={args.k}")
+    for mode in QUANTIZATION_MODES:
+        index.set_quantization(mode)
+        latencies = time_calls(index.search, [(v, args.k) for v in query_vectors], args.rounds)
+        print(f"  {mode:<7} memory {index.memory_bytes() / 1e6:8.2f} MB | recall@{args.k} {recall():.3f} "
+              f"(rescore_factor {index.rescore_factor})")
+        summarize(f"{mode} search", latencies)
+        if mode != "none":
+            # How deep the exact rescoring pool has to be for this mode
+            sweep = []
+            for factor in (1, 2, 4, 10, 20):
+                index.rescore_factor = factor
+                sweep.append(f"x{factor} {recall():.3f}")
+            index.rescore_factor = None
+            print(f"    recall@{args.k} by rescore_factor: " + " | ".join(sweep))
+
+
+def bench_hybrid(args):
+    """Latency of the dense stage, the BM25 stage and the fused hybrid retriever"""
+    from keyword_index import HybridRetriever, KeywordIndex
+
+    embeddings = load_query_embeddings()
+    keyword_index = KeywordIndex()
+    if not len(keyword_index):
+        print("Keyword index is empty (run python pinecone_utils.py first)")
+        return 1
+
+    vector_store = load_vector_store(embeddings)
+
+    retriever = HybridRetriever(vector_store=vector_store, keyword_index=keyword_index, k=3)
+    query_args = [(q,) for q in SAMPLE_QUERIES]
+    print(f"Hybrid retrieval over {len(SAMPLE_QUERIES)} queries x {args.rounds} rounds "
+          f"({len(keyword_index)} chunks, fetch_k={retriever.fetch_k})")
+    summarize("dense stage", time_calls(lambda q: vector_store.similarity_search(q, k=retriever.fetch_k),
+                                        query_args, args.rounds))
+    summarize("bm25 stage", time_calls(lambda q: keyword_index.search(q, k=retriever.fetch_k),
+                                       query_args, args.rounds))
+    summarize("hybrid (fused)", time_calls(retriever.invoke, query_args, args.rounds))
+
+
+def bench_embeddings(args):
+    """Cosine parity of the ONNX backends against torch, plus query/batch throughput"""
+    import numpy as np
+    from onnx_embeddings import EMBEDDING_BACKENDS, create_embeddings
+
+    texts = SAMPLE_QUERIES * 10
+    models = {backend: create_embeddings(backend, normalize=True) for backend in EMBEDDING_BACKENDS}
+    reference = np.asarray(models["torch"].embed_documents(texts))
+
+    print(f"Embedding backends over {len(texts)} texts x {args.rounds} rounds")
+    failed = False
+    for backend, model in models.items():
+        vectors = np.asarray(model.embed_documents(texts))
+        cosine = (vectors * reference).sum(axis=1)
+        # Both sides are normalized, so the row-wise dot product is the cosine
+        ok = cosine.min() >= args.min_cosine
+        failed |= not ok
+        print(f"  {backend:<10} cosine vs torch: min {cosine.min():.4f} mean {cosine.mean():.4f} "
+              f"{'OK' if ok else 'BELOW ' + str(args.min_cosine)}")
+
+        summarize(f"{backend} query", time_calls(model.embed_query, [(t,) for t in SAMPLE_QUERIES], args.rounds))
+        batch_ms = time_calls(model.embed_documents, [(texts,)], args.rounds)
+        print(f"  {backend + ' batch':<28} {len(texts) * 1000 / statistics.mean(batch_ms):8.1f} texts/s")
+    return 1 if failed else 0
+
+
+def bench_rewrite(args):
+    """Time-to-first-token with the question rewrite always on, skipped, or overlapped"""
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langchain_openai import ChatOpenAI
+    from rag_chain import REWRITE_MODES, build_rag_chain, time_to_first_token
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY not set")
+        return 1
+    embeddings = load_query_embeddings()
+    retriever = load_retriever(embeddings)
+    chat = ChatOpenAI(model="gpt-3.5-turbo-1106", temperature=0.5, max_tokens=1000, timeout=30)
+    history = [
+        HumanMessage(content="What is the admission process for B.Tech?"),
+        AIMessage(content="Admission to B.Tech is based on the entrance exam rank followed by counselling."),
+    ]
+    # Standalone questions and follow-ups that need the history
+    questions = SAMPLE_QUERIES[1:6] + [
+        "What about the fees for it?",
+        "And the last date?",
+        "Is there a hostel for them?",
+        "What documents do I need for that?",
+        "Can you tell me more?",
+    ]
+    # The previous question asked again, word for word and reworded: standalone, no rewrite expected
+    repeated = [history[0].content, "How does admission to B.Tech work?"]
+    questions += repeated
+
+    print(f"Time-to-first-token over {len(questions)} questions x {args.rounds} rounds")
+    for mode in REWRITE_MODES:
+        chain = build_rag_chain(chat, retriever, rewrite_mode=mode, embeddings=embeddings)
+        ttft, total, skipped, repeated_skipped = [], [], 0, 0
+        for _ in range(args.rounds):
+            for question in questions:
+                first_ms, total_ms, output = time_to_first_token(
+                    chain, {"input": question, "chat_history": history}
+                )
+                ttft.append(first_ms)
+                total.append(total_ms)
+                skipped += bool(output.get("rewrite_skipped"))
+                repeated_skipped += bool(output.get("rewrite_skipped")) and question in repeated
+        print(f"  {mode}: rewrite skipped for {skipped}/{len(ttft)} turns, "
+              f"{repeated_skipped}/{len(repeated) * args.rounds} repeated questions")
+        summarize(f"{mode} ttft", ttft)
+        summarize(f"{mode} total", total)
+
+
+def bench_history(args):
+    """Prompt history tokens per turn, full history vs. summarized window, on the longest stored chat"""
+    import sqlite3
+    import tempfile
+    from langchain_community.chat_message_histories import SQLChatMessageHistory
+    from langchain_openai import ChatOpenAI
+    from database import DatabaseManager
+    from history_window import HistoryWindow, count_tokens
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY not set")
+        return 1
+    with sqlite3.connect("users.db") as conn:
+        row = conn.execute("""
+            SELECT session_id, COUNT(*) AS n FROM chat_history GROUP BY session_id ORDER BY n DESC LIMIT 1
+        """).fetchone()
+    if not row:
+        print("No chat history in users.db")
+        return 1
+    messages = SQLChatMessageHistory(
+        session_id=row[0], table_name="chat_history", connection_string="sqlite:///users.db"
+    ).messages
+
+    chat = ChatOpenAI(model="gpt-3.5-turbo-1106", temperature=0)
+    # Summaries go to a scratch database, not users.db
+    with tempfile.TemporaryDirectory() as tmp:
+        window = HistoryWindow(chat, DatabaseManager(os.path.join(tmp, "summaries.db")))
+        print(f"Replaying {len(messages)} messages; history tokens before each turn (full -> windowed)")
+        full_total = windowed_total = 0
+        for turn, end in enumerate(range(0, len(messages), 2), start=1):
+            history = messages[:end]
+            start = time.perf_counter()
+            windowed = window.apply(row[0], history)
+            apply_ms = (time.perf_counter() - start) * 1000
+            full, kept = count_tokens(history, chat), count_tokens(windowed, chat)
+            full_total += full
+            windowed_total += kept
+            print(f"  turn {turn:>3}: {full:>6} -> {kept:>5} tokens ({apply_ms:7.1f} ms)")
+        print(f"  total history tokens: {full_total} -> {windowed_total} | summary folds: {window.folds}")
+
+
+def run_sessions(manager, sessions: int, ops: int):
+    """Simulate concurrent chat sessions; return (reads/s, writes/s, errors)"""
+    import random
+    import threading
+
+    user_ids = []
+    for i in range(sessions):
+        manager.create_user(f"User{i}", "Bench", f"user{i}@bench.local", "hash")
+        user_ids.append(manager.verify_user(f"user{i}@bench.local", "hash")[0])
+        manager.create_user_session(user_ids[-1], f"session-{i}")
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def session(i):
+        rng = random.Random(i)
+        reads = writes = errors = 0
+        for _ in range(ops):
+            try:
+                # Roughly what a rerun does: mostly reads, an access-time update now and then
+                if rng.random() < 0.8:
+                    manager.get_user_info(user_ids[i])
+                    manager.get_user_sessions(user_ids[i])
+                    reads += 2
+                elif manager.update_session_access_time(user_ids[i], f"session-{i}"):
+                    writes += 1
+                else:
+                    errors += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["reads"] += reads
+            counts["writes"] += writes
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return counts["reads"] / elapsed, counts["writes"] / elapsed, counts["errors"]
+
+
+def bench_database(args):
+    """DatabaseManager read/write throughput under concurrent sessions, pooled vs. a fresh connection per call"""
+    import sqlite3
+    import tempfile
+    from contextlib import closing, contextmanager
+    from database import ConnectionPool, DatabaseManager
+
+    class UnpooledManager(DatabaseManager):
+        """The previous behaviour: default rollback journal, one connection per call"""
+
+        @contextmanager
+        def get_connection(self):
+            with closing(sqlite3.connect(self.db_path)) as conn:
+                conn.row_factory = sqlite3.Row
+                with conn:
+                    yield conn
+
+    configs = (
+        ("fresh connection", lambda path: UnpooledManager(path, write_behind=False)),
+        ("pooled + WAL", lambda path: DatabaseManager(path, write_behind=False)),
+        ("pooled + write-behind", lambda path: DatabaseManager(path)),
+    )
+    print(f"DatabaseManager with {args.sessions} concurrent sessions x {args.ops} ops")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, factory in configs:
+            manager = factory(os.path.join(tmp, name.replace(" ", "_") + ".db"))
+            reads, writes, errors = run_sessions(manager, args.sessions, args.ops)
+            print(f"  {name:<22} reads {reads:9.0f}/s | writes {writes:8.0f}/s | errors {errors}")
+            if manager.access_buffer is not None:
+                manager.access_buffer.close()
+                stats = manager.access_buffer.stats()
+                print(f"  {'':<22} {stats['touches']} touches -> {stats['rows_written']} rows written "
+                      f"in {stats['flushes']} transactions")
+            if isinstance(manager.pool, ConnectionPool):
+                manager.pool.close()
+
+
+def bench_chat_history(args):
+    """Per-turn history overhead: a new SQLChatMessageHistory per call vs. the shared-engine factory"""
+    import tempfile
+    from langchain_community.chat_message_histories import SQLChatMessageHistory
+    from langchain_core.messages import AIMessage, HumanMessage
+    from chat_history_store import HistoryFactory, create_history_engine
+    from database import DatabaseManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "history.db")
+        DatabaseManager(db_path, write_behind=False)
+        factory = HistoryFactory(create_history_engine(db_path))
+        session_ids = [f"session-{i}" for i in range(args.sessions)]
+        for session_id in session_ids:
+            factory(session_id).add_messages([
+                message
+                for q in SAMPLE_QUERIES
+                for message in (HumanMessage(content=q), AIMessage(content="An answer about " + q.lower()))
+            ])
+
+        def per_call(session_id):
+            return SQLChatMessageHistory(
+                session_id=session_id, table_name="chat_history", connection=f"sqlite:///{db_path}"
+            )
+
+        def turn(get_history, session_id):
+            # What RunnableWithMessageHistory does around one turn
+            history = get_history(session_id)
+            history.messages
+            history.add_messages([HumanMessage(content="benchmark question"), AIMessage(content="benchmark answer")])
+
+        print(f"Chat history turns over {len(session_ids)} sessions x {args.rounds} rounds")
+        summarize("new history per call", time_calls(lambda s: turn(per_call, s), [(s,) for s in session_ids],
+                                                     args.rounds))
+        summarize("shared engine factory", time_calls(lambda s: turn(factory, s), [(s,) for s in session_ids],
+                                                      args.rounds))
+        summarize("  get history only (old)", time_calls(per_call, [(s,) for s in session_ids], args.rounds))
+        summarize("  get history only (new)", time_calls(factory, [(s,) for s in session_ids], args.rounds))
+        factory.engine.dispose()
+
+
+def bench_analytics(args):
+    """Dashboard load from the rollups vs. aggregating the raw event log, as the event count grows"""
+    import random
+    import tempfile
+    from database import DatabaseManager
+
+    def scan_events(manager):
+        # What the dashboard would cost without rollups
+        with manager.get_connection() as conn:
+            conn.execute("""
+                SELECT strftime('%Y-%m-%d', created_at), COUNT(*), SUM(cache_hit), AVG(latency_ms)
+                FROM query_events GROUP BY 1
+            """).fetchall()
+            conn.execute("""
+                SELECT question, COUNT(*) FROM query_events GROUP BY question ORDER BY 2 DESC LIMIT 10
+            """).fetchall()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DatabaseManager(os.path.join(tmp, "analytics.db"), write_behind=False)
+        questions = SAMPLE_QUERIES + [f"{q} (variant {i})" for q in SAMPLE_QUERIES for i in range(50)]
+        print(f"Query analytics, {args.ops} events per step")
+        for step in range(1, 4):
+            record = time_calls(
+                lambda q: manager.record_query_event(1, q, random.uniform(500, 5000), 300.0, random.random() < 0.3,
+                                                     12, 300, 150),
+                [(random.choice(questions),) for _ in range(args.ops)],
+            )
+            summarize(f"record event (n={step * args.ops})", record)
+            summarize("  dashboard from rollups", time_calls(manager.get_analytics_dashboard, [()], args.rounds))
+            summarize("  scan of query_events", time_calls(scan_events, [(manager,)], args.rounds))
+
+
+def bench_archive(args):
+    """Space saved and lookup latency of the hot tier vs. the compressed archive tier"""
+    import random
+    import tempfile
+    from langchain_core.messages import AIMessage, HumanMessage
+    from chat_history_store import HistoryFactory, create_history_engine
+    from database import DatabaseManager, compress_message, decompress_message
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "archive.db")
+        manager = DatabaseManager(db_path, write_behind=False)
+        factory = HistoryFactory(create_history_engine(db_path))
+        hot = [f"hot-{i}" for i in range(args.sessions)]
+        cold = [f"cold-{i}" for i in range(args.sessions)]
+        # Varied answer text, so neither layout compresses a copy-pasted filler
+        rng = random.Random(0)
+        vocabulary = sorted({w.strip("?.,").lower() for q in SAMPLE_QUERIES for w in q.split()})
+        vocabulary += [f"{w}{n}" for w in ("course", "fee", "room", "exam", "batch") for n in range(40)]
+        for session_id in hot + cold:
+            messages = []
+            for i in range(args.ops // 2):
+                q = rng.choice(SAMPLE_QUERIES)
+                answer = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(20, 120)))
+                messages += [HumanMessage(content=q), AIMessage(content=answer.capitalize() + ".")]
+            factory(session_id).add_messages(messages)
+
+        # Age the cold sessions past the cutoff and move them to the archive
+        placeholders = ",".join("?" for _ in cold)
+        with manager.get_connection() as conn:
+            conn.execute(f"UPDATE chat_history SET created_at = datetime('now', '-365 days') "
+                         f"WHERE session_id IN ({placeholders})", cold)
+        report = {}
+        manager.archive_old_messages(days=30, pause_seconds=0, report=report)
+
+        # Per-row compression (what the archive stores) vs. one compressed block per session
+        with manager.get_connection() as conn:
+            rows = conn.execute("SELECT session_id, message FROM chat_history_archive ORDER BY id").fetchall()
+            by_session = {}
+            for session_id, data in rows:
+                by_session.setdefault(session_id, []).append(decompress_message(data))
+            raw = sum(len(m.encode("utf-8")) for messages in by_session.values() for m in messages)
+            per_row = sum(len(data) for _, data in rows)
+            conn.execute("CREATE TABLE bench_blocks (session_id TEXT PRIMARY KEY, data BLOB)")
+            conn.executemany("INSERT INTO bench_blocks VALUES (?, ?)",
+                             [(s, compress_message("\n".join(m))) for s, m in by_session.items()])
+            per_block = conn.execute("SELECT SUM(LENGTH(data)) FROM bench_blocks").fetchone()[0]
+
+        def block_page(session_id, limit=20):
+            with manager.get_connection() as conn:
+                data = conn.execute("SELECT data FROM bench_blocks WHERE session_id = ?", (session_id,)).fetchone()[0]
+            return decompress_message(data).split("\n")[-limit:]
+
+        print(f"Archive: {report['archived']} messages from {len(cold)} sessions "
+              f"at {report['rows_per_second']:.0f} rows/s")
+        print(f"  raw JSON                     {raw / 1024:9.0f} KB")
+        print(f"  per-row zlib + dictionary    {per_row / 1024:9.0f} KB ({raw / per_row:.1f}x)")
+        print(f"  per-session block            {per_block / 1024:9.0f} KB ({raw / per_block:.1f}x)")
+        print(f"Lookups over {args.sessions} sessions of {args.ops} messages x {args.rounds} rounds")
+        summarize("page of 20, hot", time_calls(lambda s: manager.get_chat_messages_before(s, None, 20),
+                                                [(s,) for s in hot], args.rounds))
+        summarize("page of 20, archived", time_calls(lambda s: manager.get_chat_messages_before(s, None, 20),
+                                                     [(s,) for s in cold], args.rounds))
+        summarize("page of 20, session block", time_calls(block_page, [(s,) for s in cold], args.rounds))
+        summarize("full history, hot", time_calls(lambda s: factory(s).messages, [(s,) for s in hot],
+                                                  args.rounds))
+        summarize("full history, archived", time_calls(lambda s: factory(s).messages, [(s,) for s in cold],
+                                                       args.rounds))
+        factory.engine.dispose()
+
+
+BENCHMARKS = {
+    "retrieval": bench_retrieval,
+    "quantization": bench_quantization,
+    "hybrid": bench_hybrid,
+    "embeddings": bench_embeddings,
+    "rewrite": bench_rewrite,
+    "history": bench_history,
+    "database": bench_database,
+    "chat-history": bench_chat_history,
+    "analytics": bench_analytics,
+    "archive": bench_archive,
+}
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Campus Knowledge Engine benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=200)
+    parsed = parser.parse_args()
+    sys.exit(BENCHMARKS[parsed.benchmark](parsed))
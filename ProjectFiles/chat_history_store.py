@@ -0,0 +1,104 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import List
+
+from langchain_community.chat_message_histories import SQLChatMessageHistory
+from langchain_core.messages import BaseMessage, messages_from_dict
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import QueuePool
+
+from database import decompress_message
+
+CHAT_HISTORY_TABLE = "chat_history"
+CHAT_ARCHIVE_TABLE = "chat_history_archive"
+
+
+def create_history_engine(db_path: str = "users.db", pool_size: int = 10, max_overflow: int = 20):
+    """One pooled SQLAlchemy engine for the chat history, tuned for many concurrent readers"""
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        # Explicit: SQLAlchemy 1.4 defaults file databases to NullPool, which rejects pool_size
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        connect_args={"check_same_thread": False, "timeout": 5},
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA cache_size=-16000")  # 16 MB page cache per connection
+        cursor.execute("PRAGMA mmap_size=268435456")  # Map up to 256 MB for reads
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    return engine
+
+
+class TieredChatMessageHistory(SQLChatMessageHistory):
+    """SQLChatMessageHistory that also reads the compressed archive tier.
+
+    New messages are written to the hot chat_history table as usual; reads
+    prepend whatever the retention job moved to chat_history_archive.
+    """
+
+    def __init__(self, session_id: str, table_name: str, connection, archive_table: str):
+        super().__init__(session_id=session_id, table_name=table_name, connection=connection)
+        self.archive_engine = connection
+        self.archive_table = archive_table
+
+    def _archived_messages(self) -> List[BaseMessage]:
+        with self.archive_engine.connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT message FROM {self.archive_table} WHERE session_id = :session_id ORDER BY id"),
+                {"session_id": self.session_id},
+            ).fetchall()
+        return messages_from_dict([json.loads(decompress_message(row[0])) for row in rows])
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self._archived_messages() + super().messages
+
+    def clear(self) -> None:
+        super().clear()
+        with self.archive_engine.begin() as conn:
+            conn.execute(
+                text(f"DELETE FROM {self.archive_table} WHERE session_id = :session_id"),
+                {"session_id": self.session_id},
+            )
+
+
+class HistoryFactory:
+    """get_session_history for RunnableWithMessageHistory backed by one shared engine.
+
+    History objects are reused per session_id (up to max_sessions, least
+    recently used dropped first), so neither an engine nor the table check
+    in SQLChatMessageHistory.__init__ is repeated per call.
+    """
+
+    def __init__(self, engine, table_name: str = CHAT_HISTORY_TABLE, max_sessions: int = 1024,
+                 archive_table: str = CHAT_ARCHIVE_TABLE):
+        self.engine = engine
+        self.table_name = table_name
+        self.archive_table = archive_table
+        self.max_sessions = max_sessions
+        self._histories = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, session_id: str) -> TieredChatMessageHistory:
+        with self._lock:
+            history = self._histories.get(session_id)
+            if history is not None:
+                self._histories.move_to_end(session_id)
+                return history
+        history = TieredChatMessageHistory(session_id, self.table_name, self.engine, self.archive_table)
+        with self._lock:
+            history = self._histories.setdefault(session_id, history)
+            self._histories.move_to_end(session_id)
+            while len(self._histories) > self.max_sessions:
+                self._histories.popitem(last=False)
+        return history
@@ -1,128 +1,596 @@
 import sqlite3
 import os
-from datetime import datetime
+import queue
+import re
+import json
+import zlib
+import base64
+import hashlib
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from typing import Optional, Tuple, List
 
-class DatabaseManager:
-    def __init__(self, db_path="users.db"):
+# Preset zlib dictionary with the JSON boilerplate of serialized LangChain messages.
+# Short messages compress ~2x with it vs ~1.4x without. Never change it in place:
+# archived rows can only be decompressed with the dictionary they were written with.
+_ARCHIVE_ZDICT = (
+    b'"additional_kwargs": {}, "response_metadata": {}, "type": "ai", "name": null, "id": null, "example": false, '
+    b'"tool_calls": [], "invalid_tool_calls": [], "usage_metadata": null}}'
+    b'{"type": "human", "data": {"content": "'
+    b'{"type": "ai", "data": {"content": "'
+    b'"additional_kwargs": {}, "response_metadata": {}, "type": "human", "name": null, "id": null, "example": false}}'
+)
+
+def compress_message(message: str) -> bytes:
+    """Archive encoding of a chat_history message (zlib-compressed JSON)"""
+    compressor = zlib.compressobj(6, zdict=_ARCHIVE_ZDICT)
+    return compressor.compress(message.encode("utf-8")) + compressor.flush()
+
+def decompress_message(data: bytes) -> str:
+    decompressor = zlib.decompressobj(zdict=_ARCHIVE_ZDICT)
+    return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections configured for concurrent sessions.
+    
+    Connections run in WAL mode (readers don't block the writer), with
+    synchronous=NORMAL, a busy timeout instead of immediate "database is
+    locked" errors, and a per-connection prepared statement cache.
+    """
+    
+    def __init__(self, db_path: str, size: int = 8, timeout: float = 30.0,
+                 busy_timeout_ms: int = 5000, cached_statements: int = 256):
         self.db_path = db_path
-        self.init_database()
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
     
-    def init_database(self):
-        """Initialize the database and create tables if they don't exist"""
-        self.create_tables()
-        self.migrate_database()
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row  # Enable column access by name
+        # Only takes effect on a new, empty database (before WAL writes the header)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
     
-    def migrate_database(self):
-        """Handle database schema migrations"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Check if old chat_history table structure exists
-            cursor.execute("PRAGMA table_info(chat_history)")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            # If old structure exists (has 'content' column), migrate to new structure
-            if 'content' in columns and 'message' not in columns:
-                print("Migrating database schema...")
-                
-                # Create new table with correct schema
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS chat_history_new (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        session_id TEXT NOT NULL,
-                        message TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Migrate existing data if any
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
                 try:
-                    cursor.execute("""
-                        INSERT INTO chat_history_new (session_id, message, created_at)
-                        SELECT session_id, content, created_at 
-                        FROM chat_history
-                    """)
-                    
-                    # Drop old table and rename new one
-                    cursor.execute("DROP TABLE chat_history")
-                    cursor.execute("ALTER TABLE chat_history_new RENAME TO chat_history")
-                    
-                    print("Database migration completed successfully.")
-                    
-                except Exception as e:
-                    print(f"Error during migration: {e}")
-                    # If migration fails, just use the new table
-                    cursor.execute("DROP TABLE IF EXISTS chat_history_new")
-                
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No free database connection for {self.db_path} after {self.timeout}s")
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success, rolls back on error"""
+        conn = self._acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
                 conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+    
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+class AccessTimeBuffer:
+    """Write-behind buffer for user_sessions.last_accessed.
+    
+    touch() only records the time in memory. A background thread writes the
+    latest time per session in one transaction every flush_interval seconds,
+    or sooner once max_pending sessions are waiting; pending touches are also
+    flushed at interpreter exit.
+    """
+    
+    def __init__(self, pool: ConnectionPool, flush_interval: float = 5.0, max_pending: int = 500):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}  # (user_id, session_id) -> UTC timestamp
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self.touches = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self._thread = threading.Thread(target=self._run, name="access-time-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def touch(self, user_id: int, session_id: str):
+        # Same format as SQLite's CURRENT_TIMESTAMP
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._pending[(user_id, session_id)] = now
+            self.touches += 1
+            if len(self._pending) >= self.max_pending:
+                self._wake.set()
+    
+    def flush(self) -> int:
+        """Write all pending touches in one transaction; returns rows updated"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            with self.pool.connection() as conn:
+                # Never move last_accessed backwards if flushes overlap
+                cursor = conn.executemany("""
+                    UPDATE user_sessions 
+                    SET last_accessed = ?
+                    WHERE user_id = ? AND session_id = ? AND last_accessed <= ?
+                """, [(ts, user_id, session_id, ts) for (user_id, session_id), ts in batch.items()])
+                updated = cursor.rowcount
+        except Exception as e:
+            print(f"Error flushing session access times: {e}")
+            with self._lock:
+                for key, ts in batch.items():
+                    self._pending.setdefault(key, ts)
+            return 0
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += updated
+        return updated
+    
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+    
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "touches": self.touches,
+                "pending": len(self._pending),
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+            }
+
+class RetentionJob:
+    """Background thread that, every interval_hours, expires sessions idle for days,
+    archives messages older than archive_days (0 disables either step), then compacts"""
+    
+    def __init__(self, db: "DatabaseManager", days: int = 30, interval_hours: float = 24.0,
+                 archive_days: int = 0):
+        self.db = db
+        self.days = days
+        self.archive_days = archive_days
+        self.interval_hours = interval_hours
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="retention-cleanup", daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+    
+    def run_once(self) -> dict:
+        report = {}
+        if self.days > 0:
+            self.db.cleanup_old_sessions(self.days, report=report)
+            print(f"🧹 Retention: {report['sessions']} sessions / {report['messages']} messages deleted "
+                  f"in {report['seconds']:.1f}s ({report['rows_per_second']:.0f} rows/s), "
+                  f"{report['transactions']} transactions, max pause {report['max_pause_ms']:.1f}ms, "
+                  f"mean pause {report['mean_pause_ms']:.1f}ms")
+        if self.archive_days > 0:
+            archive = report["archive"] = {}
+            self.db.archive_old_messages(self.archive_days, report=archive)
+            print(f"🗄 Archive: {archive['archived']} messages moved in {archive['seconds']:.1f}s "
+                  f"({archive['rows_per_second']:.0f} rows/s), compression {archive['compression_ratio'] or 0:.1f}x, "
+                  f"max pause {archive['max_pause_ms']:.1f}ms")
+        report["compaction"] = self.db.compact_database()
+        print(f"🧹 Compaction: {report['compaction']}")
+        self.last_report = report
+        return report
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"⚠ Retention job failed: {e}")
+            self._stop.wait(self.interval_hours * 3600)
+
+_pools = {}
+_access_buffers = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """One pool per database file, shared by every DatabaseManager in the process"""
+    with _pools_lock:
+        key = os.path.abspath(db_path)
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_path)
+        return _pools[key]
+
+_databases = {}
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+def get_database(db_path: str = "users.db") -> "DatabaseManager":
+    """Process-wide DatabaseManager for a database file; schema setup runs on first use only"""
+    key = os.path.abspath(db_path)
+    with _schema_lock:
+        if key in _databases:
+            return _databases[key]
+    database = DatabaseManager(db_path)
+    with _schema_lock:
+        return _databases.setdefault(key, database)
+
+def get_access_buffer(db_path: str) -> AccessTimeBuffer:
+    """One access-time buffer per database file"""
+    pool = get_pool(db_path)
+    with _pools_lock:
+        key = os.path.abspath(db_path)
+        if key not in _access_buffers:
+            _access_buffers[key] = AccessTimeBuffer(pool)
+        return _access_buffers[key]
+
+class DatabaseManager:
+    # Schema migrations as (version, description, method name), applied in order.
+    # Each runs in its own transaction and is recorded in schema_version;
+    # they are written to be safe on databases created before versioning.
+    MIGRATIONS = [
+        (1, "users, chat history and sessions", "_migration_1_base_schema"),
+        (2, "chat summaries", "_migration_2_chat_summaries"),
+        (3, "content-addressed profile pictures", "_migration_3_image_store"),
+        (4, "compressed chat history archive", "_migration_4_chat_archive"),
+        (5, "full-text search over chat history", "_migration_5_chat_search"),
+        (6, "query analytics events and rollups", "_migration_6_query_analytics"),
+    ]
+    # Distinct questions tracked by the popular-questions sketch
+    POPULAR_QUESTIONS_CAPACITY = 200
+    
+    def __init__(self, db_path="users.db", write_behind: bool = True):
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        # Session access times are buffered and written in batches
+        self.access_buffer = get_access_buffer(db_path) if write_behind else None
+        self.init_database()
+    
+    def init_database(self):
+        """Bring the schema up to date, once per process and database file"""
+        key = os.path.abspath(self.db_path)
+        with _schema_lock:
+            if key in _schema_ready:
+                return
+            self.migrate_database()
+            _schema_ready.add(key)
     
     def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Enable column access by name
-        return conn
+        """Get a pooled database connection (use as a context manager)"""
+        return self.pool.connection()
     
-    def create_tables(self):
-        """Create necessary tables"""
+    # ----------- Schema migrations -----------
+    def get_schema_version(self) -> int:
+        """Highest applied migration version (0 for a new database)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            
-            # Users table
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    first_name TEXT NOT NULL,
-                    last_name TEXT NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    profile_picture TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
-            
-            # Chat history table (for LangChain SQLChatMessageHistory)
-            # This matches the expected schema for SQLChatMessageHistory
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            return cursor.fetchone()[0]
+    
+    def migrate_database(self) -> List[int]:
+        """Apply pending schema migrations; returns the versions applied"""
+        applied = []
+        if self.get_schema_version() >= self.MIGRATIONS[-1][0]:
+            return applied
+        for version, description, method in self.MIGRATIONS:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                # Take the write lock first so concurrent processes migrate one at a time
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,))
+                if cursor.fetchone():
+                    conn.rollback()
+                    continue
+                print(f"Applying database migration {version}: {description}...")
+                getattr(self, method)(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description)
+                )
+                conn.commit()
+                applied.append(version)
+        if applied:
+            print(f"Database schema is at version {applied[-1]}.")
+        return applied
+    
+    def _migration_1_base_schema(self, cursor):
+        """Create necessary tables"""
+        # Users table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                first_name TEXT NOT NULL,
+                last_name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                profile_picture TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Chat history table (for LangChain SQLChatMessageHistory)
+        # This matches the expected schema for SQLChatMessageHistory
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chat_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # User sessions table (to track user chat sessions)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                session_id TEXT NOT NULL,
+                session_name TEXT DEFAULT 'New Chat',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id),
+                UNIQUE(user_id, session_id)
+            )
+        """)
+        
+        # Check if old chat_history table structure exists
+        cursor.execute("PRAGMA table_info(chat_history)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        # If old structure exists (has 'content' column), migrate to new structure
+        if 'content' in columns and 'message' not in columns:
+            print("Migrating chat_history to the message column...")
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chat_history (
+                CREATE TABLE chat_history_new (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     session_id TEXT NOT NULL,
                     message TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
-            
-            # User sessions table (to track user chat sessions)
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    session_id TEXT NOT NULL,
-                    session_name TEXT DEFAULT 'New Chat',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    UNIQUE(user_id, session_id)
+                INSERT INTO chat_history_new (session_id, message, created_at)
+                SELECT session_id, content, created_at 
+                FROM chat_history
+            """)
+            # Drop old table and rename new one
+            cursor.execute("DROP TABLE chat_history")
+            cursor.execute("ALTER TABLE chat_history_new RENAME TO chat_history")
+        
+        # Create indexes for better performance
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history(session_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+    
+    def _migration_2_chat_summaries(self, cursor):
+        # Rolling summary of the chat turns that fell out of the prompt window
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                summarized_count INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    
+    def _migration_3_image_store(self, cursor):
+        # Content-addressed image store (profile pictures), keyed by sha256 of the bytes
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                hash TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("PRAGMA table_info(users)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'profile_picture_hash' not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN profile_picture_hash TEXT")
+        
+        # Move base64 profile pictures into the image store
+        cursor.execute("SELECT id, profile_picture FROM users WHERE profile_picture IS NOT NULL")
+        rows = cursor.fetchall()
+        for user_id, encoded in rows:
+            try:
+                image_hash = self._store_image(cursor, base64.b64decode(encoded))
+            except Exception as e:
+                print(f"Error migrating profile picture of user {user_id}: {e}")
+                image_hash = None
+            cursor.execute("""
+                UPDATE users SET profile_picture_hash = ?, profile_picture = NULL WHERE id = ?
+            """, (image_hash, user_id))
+        if rows:
+            print(f"Moved {len(rows)} profile pictures to the image store.")
+    
+    def _migration_4_chat_archive(self, cursor):
+        # Cold tier of chat_history: same ids (AUTOINCREMENT never reuses them), zlib-compressed message
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chat_history_archive (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                message BLOB NOT NULL,
+                created_at TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_archive_session ON chat_history_archive(session_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_created ON chat_history(created_at)")
+    
+    def _migration_5_chat_search(self, cursor):
+        # FTS5 index over message text; rowid = chat_history.id in either tier
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chat_history_fts
+            USING fts5(content, session_id UNINDEXED, role UNINDEXED, tokenize='porter unicode61')
+        """)
+        # Hot rows are indexed by triggers; archive_old_messages re-adds the rows it moves
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS chat_history_fts_ai AFTER INSERT ON chat_history BEGIN
+                INSERT INTO chat_history_fts (rowid, content, session_id, role)
+                VALUES (new.id, json_extract(new.message, '$.data.content'), new.session_id,
+                        json_extract(new.message, '$.type'));
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS chat_history_fts_ad AFTER DELETE ON chat_history BEGIN
+                DELETE FROM chat_history_fts WHERE rowid = old.id;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS chat_history_archive_fts_ad AFTER DELETE ON chat_history_archive BEGIN
+                DELETE FROM chat_history_fts WHERE rowid = old.id;
+            END
+        """)
+        
+        # Backfill both tiers
+        cursor.execute("""
+            INSERT INTO chat_history_fts (rowid, content, session_id, role)
+            SELECT id, json_extract(message, '$.data.content'), session_id, json_extract(message, '$.type')
+            FROM chat_history
+        """)
+        cursor.execute("SELECT id, session_id, message FROM chat_history_archive")
+        rows = []
+        for row_id, session_id, data in cursor.fetchall():
+            content, role = self._search_fields(decompress_message(data))
+            rows.append((row_id, content, session_id, role))
+        cursor.executemany(
+            "INSERT INTO chat_history_fts (rowid, content, session_id, role) VALUES (?, ?, ?, ?)", rows
+        )
+    
+    def _migration_6_query_analytics(self, cursor):
+        # Append-only log of answered questions; dashboards read the rollups below instead
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS query_events (
+                id INTEGER PRIMARY KEY,
+                created_at TIMESTAMP NOT NULL,
+                user_id INTEGER,
+                question TEXT NOT NULL,
+                latency_ms REAL,
+                ttft_ms REAL,
+                cache_hit INTEGER NOT NULL DEFAULT 0,
+                question_tokens INTEGER NOT NULL DEFAULT 0,
+                history_tokens INTEGER NOT NULL DEFAULT 0,
+                answer_tokens INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # One row per hour / day, updated in the same transaction as the event insert
+        for table in ("query_rollups_hourly", "query_rollups_daily"):
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket TEXT PRIMARY KEY,
+                    questions INTEGER NOT NULL DEFAULT 0,
+                    cache_hits INTEGER NOT NULL DEFAULT 0,
+                    latency_ms_total REAL NOT NULL DEFAULT 0,
+                    latency_ms_max REAL NOT NULL DEFAULT 0,
+                    ttft_ms_total REAL NOT NULL DEFAULT 0,
+                    question_tokens INTEGER NOT NULL DEFAULT 0,
+                    history_tokens INTEGER NOT NULL DEFAULT 0,
+                    answer_tokens INTEGER NOT NULL DEFAULT 0
                 )
             """)
-            
-            # Create indexes for better performance
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history(session_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions(user_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-            
-            conn.commit()
+        # Space-Saving sketch: at most POPULAR_QUESTIONS_CAPACITY counters, error = possible overcount
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS popular_questions (
+                question TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                error INTEGER NOT NULL DEFAULT 0,
+                last_seen TIMESTAMP NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_popular_questions_count ON popular_questions(count, last_seen)")
+    
+    @staticmethod
+    def _search_fields(message: str) -> Tuple[str, str]:
+        """(content, role) of a serialized LangChain message"""
+        data = json.loads(message)
+        return data.get("data", {}).get("content", ""), data.get("type", "")
+    
+    def _store_image(self, cursor, data: bytes) -> str:
+        """Insert image bytes once under their content hash; returns the hash"""
+        image_hash = hashlib.sha256(data).hexdigest()
+        cursor.execute("INSERT OR IGNORE INTO images (hash, data) VALUES (?, ?)", (image_hash, data))
+        return image_hash
     
-    def create_user(self, first_name: str, last_name: str, email: str, password_hash: str, profile_picture: Optional[str] = None) -> bool:
+    def _drop_unused_image(self, cursor, image_hash: Optional[str]):
+        if image_hash:
+            cursor.execute("""
+                DELETE FROM images 
+                WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM users WHERE profile_picture_hash = ?)
+            """, (image_hash, image_hash))
+    
+    def get_image(self, image_hash: str) -> Optional[bytes]:
+        """Get image bytes by content hash"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT data FROM images WHERE hash = ?", (image_hash,))
+            result = cursor.fetchone()
+            if result:
+                return result[0]
+            return None
+    
+    def create_user(self, first_name: str, last_name: str, email: str, password_hash: str, profile_picture: Optional[bytes] = None) -> bool:
         """Create a new user"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                image_hash = self._store_image(cursor, profile_picture) if profile_picture else None
                 cursor.execute("""
-                    INSERT INTO users (first_name, last_name, email, password_hash, profile_picture)
+                    INSERT INTO users (first_name, last_name, email, password_hash, profile_picture_hash)
                     VALUES (?, ?, ?, ?, ?)
-                """, (first_name, last_name, email, password_hash, profile_picture))
+                """, (first_name, last_name, email, password_hash, image_hash))
                 conn.commit()
                 return True
         except sqlite3.IntegrityError:
@@ -157,7 +625,7 @@ class DatabaseManager:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, first_name, last_name, email, created_at, profile_picture
+                SELECT id, first_name, last_name, email, created_at, profile_picture_hash
                 FROM users 
                 WHERE id = ?
             """, (user_id,))
@@ -167,27 +635,34 @@ class DatabaseManager:
             return None
     
     def get_user_profile_picture(self, user_id: int) -> Optional[str]:
-        """Get user's profile picture data"""
+        """Get the content hash of the user's profile picture (changes whenever the picture does)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT profile_picture FROM users WHERE id = ?", (user_id,))
+            cursor.execute("SELECT profile_picture_hash FROM users WHERE id = ?", (user_id,))
             result = cursor.fetchone()
             if result:
                 return result[0]
             return None
     
-    def update_profile_picture(self, user_id: int, profile_picture_data: str) -> bool:
+    def update_profile_picture(self, user_id: int, profile_picture_data: bytes) -> bool:
         """Update user's profile picture"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                cursor.execute("SELECT profile_picture_hash FROM users WHERE id = ?", (user_id,))
+                result = cursor.fetchone()
+                old_hash = result[0] if result else None
+                image_hash = self._store_image(cursor, profile_picture_data)
                 cursor.execute("""
                     UPDATE users 
-                    SET profile_picture = ?, updated_at = CURRENT_TIMESTAMP
+                    SET profile_picture_hash = ?, updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
-                """, (profile_picture_data, user_id))
+                """, (image_hash, user_id))
+                updated = cursor.rowcount > 0
+                if old_hash != image_hash:
+                    self._drop_unused_image(cursor, old_hash)
                 conn.commit()
-                return cursor.rowcount > 0
+                return updated
         except Exception as e:
             print(f"Error updating profile picture: {e}")
             return False
@@ -234,7 +709,7 @@ class DatabaseManager:
             return False
     
     def get_user_sessions(self, user_id: int) -> List[Tuple]:
-        """Get all sessions for a user"""
+        """Get all sessions for a user (last_accessed may lag by one flush interval)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -262,7 +737,10 @@ class DatabaseManager:
             return False
     
     def update_session_access_time(self, user_id: int, session_id: str) -> bool:
-        """Update the last accessed time for a session"""
+        """Update the last accessed time for a session (buffered when write_behind is on)"""
+        if self.access_buffer is not None:
+            self.access_buffer.touch(user_id, session_id)
+            return True
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
@@ -285,6 +763,8 @@ class DatabaseManager:
                 
                 # Delete chat history for this session
                 cursor.execute("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
+                cursor.execute("DELETE FROM chat_history_archive WHERE session_id = ?", (session_id,))
+                cursor.execute("DELETE FROM chat_summaries WHERE session_id = ?", (session_id,))
                 
                 # Delete user session record
                 cursor.execute("""
@@ -298,6 +778,108 @@ class DatabaseManager:
             print(f"Error deleting user session: {e}")
             return False
     
+    def get_chat_messages_before(self, session_id: str, before_id: Optional[int] = None,
+                                 limit: int = 20) -> List[Tuple]:
+        """Get up to limit (id, message) rows older than before_id, newest first (both tiers)"""
+        # Keyset pagination: the session_id indexes also order by rowid (= id)
+        before_id = before_id if before_id is not None else 2 ** 63 - 1
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, message FROM chat_history
+                WHERE session_id = ? AND id < ?
+                ORDER BY id DESC
+                LIMIT ?
+            """, (session_id, before_id, limit))
+            rows = [tuple(row) for row in cursor.fetchall()]
+            if len(rows) < limit:
+                # Older messages may have moved to the archive
+                cursor.execute("""
+                    SELECT id, message FROM chat_history_archive
+                    WHERE session_id = ? AND id < ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                """, (session_id, rows[-1][0] if rows else before_id, limit - len(rows)))
+                rows.extend((row_id, decompress_message(data)) for row_id, data in cursor.fetchall())
+            return rows
+    
+    def get_chat_messages_after(self, session_id: str, after_id: int) -> List[Tuple]:
+        """Get the (id, message) rows newer than after_id, oldest first"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, message FROM chat_history
+                WHERE session_id = ? AND id > ?
+                ORDER BY id
+            """, (session_id, after_id))
+            return [tuple(row) for row in cursor.fetchall()]
+    
+    def search_chat_history(self, user_id: int, query: str, limit: int = 20) -> List[Tuple]:
+        """Full-text search over the user's own chats, best match first.
+        
+        Returns (message_id, session_id, role, snippet) rows; matches are
+        wrapped in ** for markdown, and the last word matches as a prefix.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT f.rowid, f.session_id, f.role,
+                           snippet(chat_history_fts, 0, '**', '**', '…', 16)
+                    FROM chat_history_fts f
+                    WHERE chat_history_fts MATCH ?
+                      AND f.session_id IN (SELECT session_id FROM user_sessions WHERE user_id = ?)
+                    ORDER BY rank
+                    LIMIT ?
+                """, (match.strip(), user_id, limit))
+                return [tuple(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error searching chat history: {e}")
+            return []
+    
+    def get_chat_summary(self, session_id: str) -> Optional[Tuple[str, int]]:
+        """Get the rolling summary and how many messages it covers"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT summary, summarized_count FROM chat_summaries WHERE session_id = ?
+            """, (session_id,))
+            result = cursor.fetchone()
+            if result:
+                return tuple(result)
+            return None
+    
+    def save_chat_summary(self, session_id: str, summary: str, summarized_count: int) -> bool:
+        """Store the rolling summary for a session"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT OR REPLACE INTO chat_summaries (session_id, summary, summarized_count, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, (session_id, summary, summarized_count))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error saving chat summary: {e}")
+            return False
+    
+    def delete_chat_summary(self, session_id: str) -> bool:
+        """Forget the rolling summary (e.g. after the chat was cleared)"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM chat_summaries WHERE session_id = ?", (session_id,))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error deleting chat summary: {e}")
+            return False
+    
     def get_user_chat_count(self, user_id: int) -> int:
         """Get total number of chat sessions for a user"""
         with self.get_connection() as conn:
@@ -308,37 +890,181 @@ class DatabaseManager:
             result = cursor.fetchone()
             return result[0] if result else 0
     
-    def cleanup_old_sessions(self, days: int = 30) -> int:
-        """Clean up old sessions (older than specified days)"""
-        try:
+    def cleanup_old_sessions(self, days: int = 30, batch_size: int = 200, message_batch_size: int = 2000,
+                             pause_seconds: float = 0.05, report: Optional[dict] = None) -> int:
+        """Clean up old sessions (older than specified days) in short batched transactions
+        
+        Each transaction deletes at most batch_size sessions or message_batch_size
+        messages, and the job sleeps pause_seconds between them so live sessions
+        get the write lock. Fills report with rows/s and write-lock pause times.
+        """
+        report = {} if report is None else report
+        cutoff = f"-{int(days)} days"
+        sessions = messages = 0
+        pauses = []
+        started = time.perf_counter()
+        
+        def timed(write):
+            # Flush buffered touches first so every re-check below sees current access times
+            if self.access_buffer is not None:
+                self.access_buffer.flush()
+            start = time.perf_counter()
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Get sessions to delete
-                cursor.execute("""
+                result = write(conn)
+            pauses.append((time.perf_counter() - start) * 1000)
+            time.sleep(pause_seconds)
+            return result
+        
+        try:
+            while True:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        SELECT session_id FROM user_sessions 
+                        WHERE last_accessed < datetime('now', ?)
+                        LIMIT ?
+                    """, (cutoff, batch_size))
+                    session_ids = [row[0] for row in cursor.fetchall()]
+                if not session_ids:
+                    break
+                placeholders = ','.join(['?' for _ in session_ids])
+                still_expired = f"""
                     SELECT session_id FROM user_sessions 
-                    WHERE last_accessed < datetime('now', '-{} days')
-                """.format(days))
+                    WHERE session_id IN ({placeholders}) AND last_accessed < datetime('now', ?)
+                """
                 
-                old_sessions = cursor.fetchall()
+                # Messages first, in bounded batches. Each batch re-checks the cutoff in its own
+                # transaction and skips messages newer than it, so a session that is touched
+                # (or written to by a returning user) mid-cleanup keeps its recent history.
+                for table in ("chat_history", "chat_history_archive"):
+                    while True:
+                        deleted = timed(lambda conn: conn.execute(f"""
+                            DELETE FROM {table} WHERE id IN (
+                                SELECT id FROM {table} 
+                                WHERE session_id IN ({still_expired}) AND created_at < datetime('now', ?)
+                                LIMIT ?
+                            )
+                        """, (*session_ids, cutoff, cutoff, message_batch_size)).rowcount)
+                        messages += deleted
+                        if deleted < message_batch_size:
+                            break
                 
-                if old_sessions:
-                    session_ids = [session[0] for session in old_sessions]
-                    
-                    # Delete chat history for old sessions
-                    placeholders = ','.join(['?' for _ in session_ids])
-                    cursor.execute(f"DELETE FROM chat_history WHERE session_id IN ({placeholders})", session_ids)
-                    
-                    # Delete old user sessions
-                    cursor.execute(f"DELETE FROM user_sessions WHERE session_id IN ({placeholders})", session_ids)
-                    
-                    conn.commit()
-                    return len(session_ids)
+                # Then the session rows that are still expired, and the summaries of exactly those.
+                # A session that kept messages newer than the cutoff stays, with last_accessed moved
+                # up to its newest message, so no messages are orphaned and a later run expires it.
+                def expire_sessions(conn):
+                    conn.execute(f"""
+                        UPDATE user_sessions SET last_accessed = (
+                            SELECT MAX(created_at) FROM (
+                                SELECT created_at FROM chat_history WHERE session_id = user_sessions.session_id
+                                UNION ALL
+                                SELECT created_at FROM chat_history_archive WHERE session_id = user_sessions.session_id
+                            )
+                        )
+                        WHERE session_id IN ({placeholders}) AND last_accessed < datetime('now', ?)
+                        AND (EXISTS (SELECT 1 FROM chat_history WHERE session_id = user_sessions.session_id)
+                             OR EXISTS (SELECT 1 FROM chat_history_archive WHERE session_id = user_sessions.session_id))
+                    """, (*session_ids, cutoff))
+                    expired = [row[0] for row in conn.execute(f"""
+                        DELETE FROM user_sessions 
+                        WHERE session_id IN ({placeholders}) AND last_accessed < datetime('now', ?)
+                        RETURNING session_id
+                    """, (*session_ids, cutoff)).fetchall()]
+                    if expired:
+                        conn.execute(
+                            f"DELETE FROM chat_summaries WHERE session_id IN ({','.join(['?' for _ in expired])})",
+                            expired,
+                        )
+                    return len(expired)
                 
-                return 0
+                sessions += timed(expire_sessions)
         except Exception as e:
             print(f"Error cleaning up old sessions: {e}")
-            return 0
+        
+        elapsed = time.perf_counter() - started
+        report.update({
+            "sessions": sessions,
+            "messages": messages,
+            "seconds": elapsed,
+            "rows_per_second": (sessions + messages) / elapsed if elapsed else 0.0,
+            "transactions": len(pauses),
+            "max_pause_ms": max(pauses, default=0.0),
+            "mean_pause_ms": sum(pauses) / len(pauses) if pauses else 0.0,
+        })
+        return sessions
+    
+    def archive_old_messages(self, days: int = 90, batch_size: int = 1000, pause_seconds: float = 0.05,
+                             report: Optional[dict] = None) -> int:
+        """Move chat messages older than days into the compressed archive tier, batch by batch"""
+        report = {} if report is None else report
+        cutoff = f"-{int(days)} days"
+        moved = raw_bytes = stored_bytes = 0
+        pauses = []
+        started = time.perf_counter()
+        try:
+            while True:
+                start = time.perf_counter()
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        SELECT id, session_id, message, created_at FROM chat_history
+                        WHERE created_at < datetime('now', ?)
+                        ORDER BY id
+                        LIMIT ?
+                    """, (cutoff, batch_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    archived = [
+                        (row_id, session_id, compress_message(message), created_at)
+                        for row_id, session_id, message, created_at in rows
+                    ]
+                    cursor.executemany("""
+                        INSERT OR REPLACE INTO chat_history_archive (id, session_id, message, created_at)
+                        VALUES (?, ?, ?, ?)
+                    """, archived)
+                    cursor.executemany("DELETE FROM chat_history WHERE id = ?", [(row[0],) for row in rows])
+                    # The delete trigger dropped them from the search index; keep them searchable
+                    cursor.executemany(
+                        "INSERT INTO chat_history_fts (rowid, content, role, session_id) VALUES (?, ?, ?, ?)",
+                        [(row_id, *self._search_fields(message), session_id)
+                         for row_id, session_id, message, _ in rows],
+                    )
+                moved += len(rows)
+                raw_bytes += sum(len(row[2].encode("utf-8")) for row in rows)
+                stored_bytes += sum(len(row[2]) for row in archived)
+                pauses.append((time.perf_counter() - start) * 1000)
+                time.sleep(pause_seconds)
+        except Exception as e:
+            print(f"Error archiving old messages: {e}")
+        
+        elapsed = time.perf_counter() - started
+        report.update({
+            "archived": moved,
+            "seconds": elapsed,
+            "rows_per_second": moved / elapsed if elapsed else 0.0,
+            "compression_ratio": raw_bytes / stored_bytes if stored_bytes else None,
+            "transactions": len(pauses),
+            "max_pause_ms": max(pauses, default=0.0),
+        })
+        return moved
+    
+    def compact_database(self, max_pages: int = 1000) -> dict:
+        """Reclaim free pages (when auto_vacuum=INCREMENTAL) and refresh planner statistics"""
+        start = time.perf_counter()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            freelist_before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            # Only incremental mode can give pages back without a blocking full VACUUM
+            if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                cursor.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+            cursor.execute("PRAGMA optimize")
+            freelist_after = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        return {
+            "freelist_before": freelist_before,
+            "freelist_after": freelist_after,
+            "ms": (time.perf_counter() - start) * 1000,
+        }
     
     def get_database_stats(self) -> dict:
         """Get database statistics"""
@@ -357,10 +1083,127 @@ class DatabaseManager:
             # Total messages
             cursor.execute("SELECT COUNT(*) FROM chat_history")
             stats['total_messages'] = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM chat_history_archive")
+            stats['archived_messages'] = cursor.fetchone()[0]
             
             # Database size
             cursor.execute("SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()")
             result = cursor.fetchone()
             stats['database_size_bytes'] = result[0] if result else 0
             
-        return stats
\ No newline at end of file
+        return stats
+    
+    # ----------- Query analytics -----------
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace so repeats of a question share a key"""
+        words = re.sub(r"[^\w\s]", " ", question.lower()).split()
+        return " ".join(words)[:500]
+    
+    def record_query_event(self, user_id: Optional[int], question: str, latency_ms: float,
+                           ttft_ms: Optional[float] = None, cache_hit: bool = False, question_tokens: int = 0,
+                           history_tokens: int = 0, answer_tokens: int = 0) -> bool:
+        """Log one answered question and fold it into the hourly/daily rollups and the popular-questions sketch"""
+        question = self.normalize_question(question)
+        if not question:
+            return False
+        now = datetime.now(timezone.utc)
+        created_at = now.strftime("%Y-%m-%d %H:%M:%S")
+        values = (1, int(bool(cache_hit)), latency_ms, latency_ms, ttft_ms or 0.0,
+                  question_tokens, history_tokens, answer_tokens)
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO query_events (created_at, user_id, question, latency_ms, ttft_ms, cache_hit,
+                                              question_tokens, history_tokens, answer_tokens)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (created_at, user_id, question, latency_ms, ttft_ms, int(bool(cache_hit)),
+                      question_tokens, history_tokens, answer_tokens))
+                
+                for table, bucket in (("query_rollups_hourly", now.strftime("%Y-%m-%d %H:00")),
+                                      ("query_rollups_daily", now.strftime("%Y-%m-%d"))):
+                    cursor.execute(f"""
+                        INSERT INTO {table} (bucket, questions, cache_hits, latency_ms_total, latency_ms_max,
+                                             ttft_ms_total, question_tokens, history_tokens, answer_tokens)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(bucket) DO UPDATE SET
+                            questions = questions + excluded.questions,
+                            cache_hits = cache_hits + excluded.cache_hits,
+                            latency_ms_total = latency_ms_total + excluded.latency_ms_total,
+                            latency_ms_max = MAX(latency_ms_max, excluded.latency_ms_max),
+                            ttft_ms_total = ttft_ms_total + excluded.ttft_ms_total,
+                            question_tokens = question_tokens + excluded.question_tokens,
+                            history_tokens = history_tokens + excluded.history_tokens,
+                            answer_tokens = answer_tokens + excluded.answer_tokens
+                    """, (bucket,) + values)
+                
+                self._count_popular_question(cursor, question, created_at)
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error recording query event: {e}")
+            return False
+    
+    def _count_popular_question(self, cursor, question: str, seen_at: str):
+        """Space-Saving update: bump a tracked question, or replace the least counted one when full"""
+        cursor.execute(
+            "UPDATE popular_questions SET count = count + 1, last_seen = ? WHERE question = ?", (seen_at, question)
+        )
+        if cursor.rowcount:
+            return
+        cursor.execute("SELECT COUNT(*) FROM popular_questions")
+        if cursor.fetchone()[0] < self.POPULAR_QUESTIONS_CAPACITY:
+            cursor.execute(
+                "INSERT INTO popular_questions (question, count, error, last_seen) VALUES (?, 1, 0, ?)",
+                (question, seen_at),
+            )
+            return
+        cursor.execute("SELECT question, count FROM popular_questions ORDER BY count, last_seen LIMIT 1")
+        evicted, min_count = cursor.fetchone()
+        cursor.execute("""
+            UPDATE popular_questions SET question = ?, count = ?, error = ?, last_seen = ?
+            WHERE question = ?
+        """, (question, min_count + 1, min_count, seen_at, evicted))
+    
+    def get_analytics_dashboard(self, hours: int = 24, days: int = 30, top_k: int = 10) -> dict:
+        """Usage per hour and day plus the most asked questions, read from the rollups only.
+        
+        Touches at most hours + days + top_k rows, however many questions have been logged.
+        """
+        now = datetime.now(timezone.utc)
+        since_hour = datetime.fromtimestamp(now.timestamp() - (hours - 1) * 3600, timezone.utc)
+        since_day = datetime.fromtimestamp(now.timestamp() - (days - 1) * 86400, timezone.utc)
+        
+        def rollup_rows(cursor, table, since):
+            cursor.execute(f"SELECT * FROM {table} WHERE bucket >= ? ORDER BY bucket", (since,))
+            rows = []
+            for row in cursor.fetchall():
+                row = dict(row)
+                questions = row["questions"] or 1
+                row["cache_hit_rate"] = row["cache_hits"] / questions
+                row["avg_latency_ms"] = row.pop("latency_ms_total") / questions
+                row["avg_ttft_ms"] = row.pop("ttft_ms_total") / questions
+                rows.append(row)
+            return rows
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            hourly = rollup_rows(cursor, "query_rollups_hourly", since_hour.strftime("%Y-%m-%d %H:00"))
+            daily = rollup_rows(cursor, "query_rollups_daily", since_day.strftime("%Y-%m-%d"))
+            cursor.execute(
+                "SELECT question, count, error FROM popular_questions ORDER BY count DESC, last_seen DESC LIMIT ?",
+                (top_k,),
+            )
+            popular = [tuple(row) for row in cursor.fetchall()]
+        
+        questions = sum(row["questions"] for row in daily)
+        return {
+            "hourly": hourly,
+            "daily": daily,
+            "popular": popular,
+            "questions": questions,
+            "cache_hit_rate": sum(row["cache_hits"] for row in daily) / questions if questions else 0.0,
+            "avg_latency_ms": sum(row["avg_latency_ms"] * row["questions"] for row in daily) / questions
+            if questions else 0.0,
+        }
@@ -0,0 +1,176 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite"
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent SQLite cache of float32 vectors keyed by (model, normalize, text hash).
+
+    Bounded by max_entries: when an insert pushes the cache over the limit,
+    the least recently used evict_fraction of entries is dropped.
+    """
+
+    def __init__(self, db_path=EMBEDDING_CACHE_PATH, max_entries: int = 500_000,
+                 evict_fraction: float = 0.1):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.evict_fraction = evict_fraction
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.create_tables()
+        # Upper bound on the row count so puts don't need a COUNT(*) each time
+        with self.get_connection() as conn:
+            self._approx_entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def create_tables(self):
+        with self.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    normalize INTEGER NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, normalize, text_hash)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            conn.commit()
+
+    def get_many(self, model: str, normalize: bool, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors in input order, None for misses"""
+        keys = [_text_key(text) for text in texts]
+        found = {}
+        with self.get_connection() as conn:
+            unique = list(set(keys))
+            # Stay well under SQLite's bound-variable limit
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                placeholders = ",".join("?" for _ in part)
+                rows = conn.execute(f"""
+                    SELECT text_hash, vector FROM embeddings
+                    WHERE model = ? AND normalize = ? AND text_hash IN ({placeholders})
+                """, (model, int(normalize), *part)).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND normalize = ? AND text_hash = ?",
+                    [(now, model, int(normalize), key) for key in found],
+                )
+                conn.commit()
+
+        results = [found.get(key) for key in keys]
+        hit_count = sum(1 for vector in results if vector is not None)
+        with self._lock:
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model: str, normalize: bool, texts: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = [
+            (model, int(normalize), _text_key(text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self.get_connection() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO embeddings (model, normalize, text_hash, vector, last_used)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+        with self._lock:
+            self._approx_entries += len(rows)
+            over_limit = self._approx_entries > self.max_entries
+        if over_limit:
+            self.evict_if_needed()
+
+    def evict_if_needed(self) -> int:
+        """Drop least recently used entries once the cache is over max_entries"""
+        with self.get_connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count <= self.max_entries:
+                with self._lock:
+                    self._approx_entries = count
+                return 0
+            to_remove = count - self.max_entries + int(self.max_entries * self.evict_fraction)
+            conn.execute("""
+                DELETE FROM embeddings WHERE rowid IN (
+                    SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?
+                )
+            """, (to_remove,))
+            conn.commit()
+        with self._lock:
+            self.evictions += to_remove
+            self._approx_entries = count - to_remove
+        return to_remove
+
+    def stats(self) -> dict:
+        with self.get_connection() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "vector_bytes": size,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings model and serves repeated texts from an EmbeddingCache"""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, normalize: bool,
+                 cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.normalize = normalize
+        self.cache = cache or EmbeddingCache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results = self.cache.get_many(self.model_name, self.normalize, texts)
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing:
+            # Embed each distinct missing text once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            vectors = self.embeddings.embed_documents(unique_texts)
+            self.cache.put_many(self.model_name, self.normalize, unique_texts, vectors)
+            computed = dict(zip(unique_texts, vectors))
+            for i in missing:
+                results[i] = computed[texts[i]]
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        cached = self.cache.get_many(self.model_name, self.normalize, [text])[0]
+        if cached is not None:
+            return cached
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.model_name, self.normalize, [text], [vector])
+        return vector
+
+    def stats(self) -> dict:
+        return self.cache.stats()
@@ -0,0 +1,49 @@
+import json
+from typing import List
+
+from langchain_core.messages import BaseMessage, messages_from_dict
+
+
+def _deserialize(rows) -> List[tuple]:
+    """(id, message JSON) rows as written by SQLChatMessageHistory -> (id, BaseMessage)"""
+    return [(row_id, messages_from_dict([json.loads(message)])[0]) for row_id, message in rows]
+
+
+class HistoryPager:
+    """Deserialized tail of one session's chat history, kept in memory between reruns.
+
+    Starts with the newest page_size messages. refresh() appends only rows
+    with a higher id than the newest one held, and load_older() prepends the
+    previous page using a keyset query on chat_history.id.
+    """
+
+    def __init__(self, db, session_id: str, page_size: int = 20):
+        self.db = db
+        self.session_id = session_id
+        self.page_size = page_size
+        self.rows = []  # (id, BaseMessage), oldest first
+        self.has_older = False
+        self.load_older()
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return [message for _, message in self.rows]
+
+    def refresh(self) -> int:
+        """Pick up rows written since the last call; returns how many were added"""
+        if not self.rows:
+            self.load_older()
+            return len(self.rows)
+        new_rows = _deserialize(self.db.get_chat_messages_after(self.session_id, self.rows[-1][0]))
+        self.rows.extend(new_rows)
+        return len(new_rows)
+
+    def load_older(self) -> int:
+        """Prepend the previous page; returns how many messages were loaded"""
+        before_id = self.rows[0][0] if self.rows else None
+        # One extra row tells whether there is yet another page
+        page = self.db.get_chat_messages_before(self.session_id, before_id, self.page_size + 1)
+        self.has_older = len(page) > self.page_size
+        page = _deserialize(reversed(page[:self.page_size]))
+        self.rows[:0] = page
+        return len(page)
@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARIZE_PROMPT = """Progressively summarize a conversation between a student and CollegeBot.
+Extend the current summary with the new lines and return ONLY the new summary.
+Keep names, programs, dates, fees and other facts the student may refer back to.
+Stay under {max_words} words.
+
+Current summary:
+{summary}
+
+New lines:
+{new_lines}"""
+
+
+def count_tokens(messages: List[BaseMessage], chat=None) -> int:
+    """Prompt tokens for messages, using the chat model's tokenizer when it has one"""
+    if not messages:
+        return 0
+    if chat is not None:
+        try:
+            return chat.get_num_tokens_from_messages(messages)
+        except Exception:
+            pass
+    # Rough fallback: ~4 characters per token
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+def _format_lines(messages: List[BaseMessage]) -> str:
+    return "\n".join(
+        f"{'Student' if message.type == 'human' else 'CollegeBot'}: {message.content}" for message in messages
+    )
+
+
+class HistoryWindow:
+    """Token-budgeted chat history: the last turns verbatim, older turns as a rolling summary.
+
+    apply() keeps at most max_turns user/assistant turns (fewer if they exceed
+    max_tokens) and folds everything older into a summary prepended as a
+    system message. The summary is stored per session with the number of
+    messages it covers, so each fold only sends the newly evicted messages
+    to the LLM. Evicted messages are folded fold_turns at a time and stay
+    verbatim until then, so the summary is not rewritten on every turn.
+
+    One instance serves every session: the summary LLM call holds only that
+    session's lock, and cached summaries are kept for up to max_sessions
+    sessions (least recently used dropped first; they reload from store).
+    """
+
+    def __init__(self, chat, store, max_turns: int = 6, max_tokens: int = 1500,
+                 fold_turns: int = 2, summary_words: int = 200, max_sessions: int = 1024):
+        self.chat = chat
+        self.store = store
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.fold_turns = fold_turns
+        self.summary_chain = ChatPromptTemplate.from_template(SUMMARIZE_PROMPT) | chat | StrOutputParser()
+        self.summary_words = summary_words
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> {"lock", "summary": (summary, summarized_count) or None}
+        self._lock = threading.Lock()  # guards _sessions and folds only
+        self.folds = 0
+
+    def _session(self, session_id: str) -> dict:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._sessions[session_id] = {"lock": threading.Lock(), "summary": None}
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return state
+
+    def clear(self, session_id: str):
+        state = self._session(session_id)
+        with state["lock"]:
+            state["summary"] = ("", 0)
+            self.store.delete_chat_summary(session_id)
+
+    def _cut(self, messages: List[BaseMessage]) -> int:
+        """Index of the first message kept verbatim under the turn and token budgets"""
+        cut = max(0, len(messages) - 2 * self.max_turns)
+        # Always keep the latest exchange, even if it alone is over budget
+        while cut < len(messages) - 2 and count_tokens(messages[cut:], self.chat) > self.max_tokens:
+            cut += 2
+        return cut
+
+    def apply(self, session_id: Optional[str], messages: List[BaseMessage]) -> List[BaseMessage]:
+        """Return the messages to put into the prompt for this turn"""
+        if not session_id or len(messages) <= 2 * self.max_turns:
+            return messages
+        cut = self._cut(messages)
+        state = self._session(session_id)
+        with state["lock"]:
+            if state["summary"] is None:
+                state["summary"] = self.store.get_chat_summary(session_id) or ("", 0)
+            summary, summarized = state["summary"]
+            if summarized > len(messages):
+                # History was cleared and regrown since the summary was written
+                summary, summarized = "", 0
+            over_budget = count_tokens(messages[summarized:], self.chat) > self.max_tokens
+            if cut - summarized >= 2 * self.fold_turns or (cut > summarized and over_budget):
+                summary = self.summary_chain.invoke({
+                    "summary": summary or "(empty)",
+                    "new_lines": _format_lines(messages[summarized:cut]),
+                    "max_words": self.summary_words,
+                }).strip()
+                summarized = cut
+                state["summary"] = (summary, summarized)
+                self.store.save_chat_summary(session_id, summary, summarized)
+                with self._lock:
+                    self.folds += 1
+
+        window = messages[summarized:]
+        if summary:
+            window = [SystemMessage(content=SUMMARY_PREFIX + summary)] + window
+        return window
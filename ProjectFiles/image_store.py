@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Callable, Optional
+
+from PIL import Image
+
+PROFILE_PICTURE_SIZE = (300, 300)
+
+
+def encode_profile_picture(uploaded_file) -> bytes:
+    """Downscale an uploaded image and encode it as PNG bytes for the image store"""
+    image = Image.open(uploaded_file)
+    image.thumbnail(PROFILE_PICTURE_SIZE, Image.Resampling.LANCZOS)
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+class ThumbnailCache:
+    """Process-wide LRU cache of rendered thumbnails keyed by (image hash, width).
+
+    Image hashes are content addresses, so they work like ETags: an unchanged
+    avatar keeps its key and is decoded and resized at most once per process.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image_hash: str, width: int, load: Callable[[str], Optional[bytes]]) -> Optional[bytes]:
+        """PNG thumbnail bytes for image_hash; load(image_hash) fetches the original on a miss"""
+        key = (image_hash, width)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        data = load(image_hash)
+        if data is None:
+            return None
+        try:
+            image = Image.open(BytesIO(data))
+            image.thumbnail((width, width), Image.Resampling.LANCZOS)
+            buffered = BytesIO()
+            image.save(buffered, format="PNG")
+            thumbnail = buffered.getvalue()
+        except Exception as e:
+            print(f"Error rendering thumbnail {image_hash[:12]}: {e}")
+            return None
+
+        with self._lock:
+            self._entries[key] = thumbnail
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return thumbnail
+
+
+thumbnail_cache = ThumbnailCache()
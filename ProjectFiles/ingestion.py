@@ -0,0 +1,379 @@
+import os
+import time
+import queue
+import threading
+from multiprocessing import Manager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pinecone_utils import iter_chunk_batches, make_chunk_id, text_hash
+
+# Sentinel pushed through the queues to tell the next stage to stop
+_STOP = object()
+
+
+# ----------- Worker run inside the process pool -----------
+def stream_and_split(path: str, out_queue, batch_size: int = 64,
+                     chunk_size: int = 500, chunk_overlap: int = 20):
+    """Stream one file's chunks into out_queue in batches (runs in a worker process).
+
+    out_queue is bounded, so a worker blocks instead of reading ahead when
+    embedding falls behind. Always finishes with a "done" or "error" message.
+    """
+    chunk_count = 0
+    try:
+        for batch in iter_chunk_batches(path, batch_size, chunk_size, chunk_overlap):
+            chunk_count += len(batch)
+            out_queue.put(("chunks", path, batch))
+        out_queue.put(("done", path, chunk_count))
+    except Exception as e:
+        out_queue.put(("error", path, f"{type(e).__name__}: {e}"))
+
+
+# ----------- Per-stage throughput counters -----------
+class StageStats:
+    """Thread-safe counter for a single pipeline stage"""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.count = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.perf_counter()
+
+    def add(self, n: int, seconds: float = 0.0):
+        with self._lock:
+            self.count += n
+            self.busy_seconds += seconds
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at or time.perf_counter()
+        return end - self.started_at
+
+    @property
+    def rate(self) -> float:
+        return self.count / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return f"{self.name}: {self.count} {self.unit} in {self.elapsed:.1f}s ({self.rate:.1f} {self.unit}/s)"
+
+
+# ----------- Vector sinks -----------
+class PineconeSink:
+    """Writes pre-computed vectors straight to a Pinecone index"""
+
+    def __init__(self, index, text_key: str = "text", namespace=None):
+        self.index = index
+        self.text_key = text_key
+        self.namespace = namespace
+
+    def upsert(self, records):
+        """Upsert a batch of (id, vector, text, metadata) records"""
+        vectors = []
+        for vector_id, values, text, metadata in records:
+            meta = dict(metadata)
+            meta[self.text_key] = text
+            vectors.append({"id": vector_id, "values": values, "metadata": meta})
+        self.index.upsert(vectors=vectors, namespace=self.namespace)
+
+    def delete(self, ids, batch_size: int = 1000):
+        """Delete vectors by ID in batches"""
+        ids = list(ids)
+        for start in range(0, len(ids), batch_size):
+            self.index.delete(ids=ids[start:start + batch_size], namespace=self.namespace)
+
+class MultiSink:
+    """Fans every upsert/delete out to several sinks (e.g. vectors + keyword index)"""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def upsert(self, records):
+        for sink in self.sinks:
+            sink.upsert(records)
+
+    def delete(self, ids):
+        ids = list(ids)
+        for sink in self.sinks:
+            sink.delete(ids)
+
+    def save(self):
+        """Persist sinks that stage writes in memory (e.g. the local index)"""
+        for sink in self.sinks:
+            if hasattr(sink, "save"):
+                sink.save()
+
+
+# ----------- Staged ingestion engine -----------
+class IngestionPipeline:
+    """Load/split -> embed -> upsert, each stage connected by bounded queues.
+
+    Loading and splitting happen in a process pool that streams pages, so at
+    most queue_size chunk batches are held in memory regardless of document
+    size. Embedding runs in batches on a single thread (the model already uses
+    every core), and upserts are spread over a small thread pool because they
+    are network bound.
+    """
+
+    def __init__(self, embeddings, sink, chunk_size=500, chunk_overlap=20,
+                 load_workers=None, embed_batch_size=64, upsert_batch_size=100,
+                 upsert_workers=4, queue_size=8):
+        self.embeddings = embeddings
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.load_workers = load_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_workers = upsert_workers
+        self.queue_size = queue_size
+
+        self.load_stats = StageStats("load+split", "files")
+        self.embed_stats = StageStats("embed", "chunks")
+        self.upsert_stats = StageStats("upsert", "vectors")
+        self.errors = []
+        self.file_vector_ids = {}
+        self.failed_paths = set()
+        self._ids_lock = threading.Lock()
+
+    def _fail(self, paths, stage, error):
+        with self._ids_lock:
+            self.failed_paths.update(paths)
+        self.errors.append((stage, error))
+
+    # --- stage 1: process pool streaming chunk batches through a bounded queue ---
+    def _load_stage(self, paths, chunk_queue):
+        self.load_stats.start()
+        try:
+            with Manager() as manager, ProcessPoolExecutor(max_workers=self.load_workers) as pool:
+                out_queue = manager.Queue(maxsize=self.queue_size)
+                futures = {
+                    pool.submit(stream_and_split, path, out_queue, self.embed_batch_size,
+                                self.chunk_size, self.chunk_overlap): path
+                    for path in paths
+                }
+                remaining = set(futures.values())
+
+                while remaining:
+                    try:
+                        kind, path, payload = out_queue.get(timeout=1)
+                    except queue.Empty:
+                        # A worker that died without reporting would otherwise hang us
+                        for future, path in futures.items():
+                            if path in remaining and future.done() and future.exception():
+                                remaining.discard(path)
+                                self._fail([path], "load", future.exception())
+                                print(f"❌ Could not process {os.path.basename(path)}: {future.exception()}")
+                        continue
+
+                    if kind == "chunks":
+                        with self._ids_lock:
+                            self.file_vector_ids.setdefault(path, [])
+                        chunk_queue.put((path, payload))
+                    elif kind == "done":
+                        remaining.discard(path)
+                        with self._ids_lock:
+                            self.file_vector_ids.setdefault(path, [])
+                        self.load_stats.add(1)
+                        print(f"✅ Loaded {os.path.basename(path)} -> {payload} chunks")
+                    else:
+                        remaining.discard(path)
+                        self._fail([path], "load", RuntimeError(payload))
+                        print(f"❌ Could not process {os.path.basename(path)}: {payload}")
+        finally:
+            self.load_stats.finish()
+            chunk_queue.put(_STOP)
+
+    # --- stage 2: batched embedding ---
+    def _embed_stage(self, chunk_queue, vector_queue):
+        self.embed_stats.start()
+        pending = []
+        try:
+            while True:
+                item = chunk_queue.get()
+                if item is _STOP:
+                    break
+                path, batch = item
+                texts = [chunk.page_content for chunk in batch]
+                t0 = time.perf_counter()
+                try:
+                    vectors = self.embeddings.embed_documents(texts)
+                except Exception as e:
+                    self._fail([path], "embed", e)
+                    print(f"❌ Embedding batch failed: {e}")
+                    continue
+                self.embed_stats.add(len(texts), time.perf_counter() - t0)
+
+                for chunk, vector in zip(batch, vectors):
+                    vector_id = make_chunk_id(chunk, source=path)
+                    with self._ids_lock:
+                        self.file_vector_ids[path].append(vector_id)
+                    pending.append((path, vector_id, vector, chunk.page_content, chunk.metadata))
+                while len(pending) >= self.upsert_batch_size:
+                    vector_queue.put(pending[:self.upsert_batch_size])
+                    pending = pending[self.upsert_batch_size:]
+            if pending:
+                vector_queue.put(pending)
+        finally:
+            self.embed_stats.finish()
+            for _ in range(self.upsert_workers):
+                vector_queue.put(_STOP)
+
+    # --- stage 3: concurrent upserts ---
+    def _upsert_worker(self, vector_queue):
+        while True:
+            records = vector_queue.get()
+            if records is _STOP:
+                break
+            self.upsert_stats.start()
+            t0 = time.perf_counter()
+            try:
+                self.sink.upsert([record[1:] for record in records])
+                self.upsert_stats.add(len(records), time.perf_counter() - t0)
+            except Exception as e:
+                self._fail({record[0] for record in records}, "upsert", e)
+                print(f"❌ Upsert of {len(records)} vectors failed: {e}")
+
+    def run(self, paths):
+        """Run all stages over the given file paths and return the stats"""
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        vector_queue = queue.Queue(maxsize=self.queue_size)
+
+        embed_thread = threading.Thread(target=self._embed_stage, args=(chunk_queue, vector_queue), daemon=True)
+        embed_thread.start()
+
+        with ThreadPoolExecutor(max_workers=self.upsert_workers) as upsert_pool:
+            for _ in range(self.upsert_workers):
+                upsert_pool.submit(self._upsert_worker, vector_queue)
+            self._load_stage(paths, chunk_queue)
+            embed_thread.join()
+        self.upsert_stats.finish()
+
+        self.report()
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            "files_per_s": self.load_stats.rate,
+            "chunks_per_s": self.embed_stats.rate,
+            "vectors_per_s": self.upsert_stats.rate,
+            "files": self.load_stats.count,
+            "chunks": self.embed_stats.count,
+            "vectors": self.upsert_stats.count,
+            "errors": len(self.errors),
+        }
+
+    def report(self):
+        print("📊 Ingestion throughput")
+        for stage in (self.load_stats, self.embed_stats, self.upsert_stats):
+            print(f"   {stage.summary()}")
+        if self.errors:
+            print(f"   ⚠ {len(self.errors)} error(s) during ingestion")
+
+
+# ----------- One-off duplicate compaction -----------
+def dedup_index(index, namespace=None, text_key: str = "text", batch_size: int = 100,
+                dry_run: bool = False) -> int:
+    """Delete vectors that repeat the same (source, page, block, text) as another vector.
+
+    Older runs used random IDs, so every rerun left a full copy of the corpus
+    behind. For each group of copies the vector whose ID matches the
+    deterministic chunk ID is kept if there is one, otherwise the first seen.
+    """
+    kept = {}
+    duplicates = []
+    for id_page in index.list(namespace=namespace):
+        ids = list(id_page)
+        for start in range(0, len(ids), batch_size):
+            fetched = index.fetch(ids=ids[start:start + batch_size], namespace=namespace)
+            for vector_id, vector in fetched.vectors.items():
+                metadata = vector.metadata or {}
+                key = (
+                    os.path.normpath(metadata.get("source", "")),
+                    str(metadata.get("page", "")),
+                    # TXT / DOCX / HTML blocks: identical paragraphs elsewhere in the file are not copies
+                    str(metadata.get("line", metadata.get("block", ""))),
+                    text_hash(metadata.get(text_key, "")),
+                )
+                if key not in kept:
+                    kept[key] = vector_id
+                    continue
+                # Prefer the vector that already carries a deterministic ID
+                if len(vector_id) == 32 and len(kept[key]) != 32:
+                    duplicates.append(kept[key])
+                    kept[key] = vector_id
+                else:
+                    duplicates.append(vector_id)
+
+    print(f"🔎 Scanned {len(kept) + len(duplicates)} vectors, {len(duplicates)} duplicates")
+    if duplicates and not dry_run:
+        PineconeSink(index, text_key=text_key, namespace=namespace).delete(duplicates)
+    return len(duplicates)
+
+
+# ----------- Incremental run driven by the manifest -----------
+def sync_folder(paths, embeddings, sink, manifest, embedding_model: str,
+                chunk_size=500, chunk_overlap=20, force=False, **pipeline_kwargs):
+    """Re-embed only new/changed files and drop vectors of removed/replaced ones.
+
+    force=True re-ingests unchanged files too, e.g. to fill a newly added sink;
+    chunk IDs are deterministic so this overwrites rather than duplicates.
+    """
+    plan = manifest.plan(paths, chunk_size, chunk_overlap, embedding_model)
+    if force:
+        plan.changed += plan.unchanged
+        plan.unchanged = []
+    print(f"🗂 Manifest: {plan.summary()}")
+
+    pipeline = IngestionPipeline(
+        embeddings=embeddings,
+        sink=sink,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        **pipeline_kwargs,
+    )
+    stats = pipeline.run(plan.to_ingest) if plan.to_ingest else pipeline.stats()
+
+    # Drop stale vectors first, then persist the sinks, and only then record the
+    # manifest: a crash before save() leaves these files unrecorded, so the next
+    # run re-ingests them (deterministic IDs make that an overwrite).
+    deleted = 0
+    ingested = [path for path in plan.to_ingest
+                if path not in pipeline.failed_paths and path in pipeline.file_vector_ids]
+    for path in ingested:
+        old_entry = manifest.get_entry(path)
+        if old_entry:
+            stale = set(old_entry["vector_ids"]) - set(pipeline.file_vector_ids[path])
+            sink.delete(stale)
+            deleted += len(stale)
+    for path in plan.removed:
+        entry = manifest.get_entry(path)
+        if entry:
+            sink.delete(entry["vector_ids"])
+            deleted += len(entry["vector_ids"])
+
+    if (plan.to_ingest or plan.removed) and hasattr(sink, "save"):
+        sink.save()
+    for path in ingested:
+        manifest.record(path, plan.hashes[path], chunk_size, chunk_overlap, embedding_model,
+                        pipeline.file_vector_ids[path])
+    for path in plan.removed:
+        manifest.remove(path)
+
+    stats["skipped_files"] = len(plan.unchanged)
+    stats["deleted_vectors"] = deleted
+    print(f"🧹 Deleted {deleted} stale vectors, skipped {len(plan.unchanged)} unchanged files")
+    return stats
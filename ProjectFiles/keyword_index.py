@@ -0,0 +1,163 @@
+import re
+import json
+import sqlite3
+import hashlib
+from typing import Any, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+KEYWORD_INDEX_PATH = "keyword_index.sqlite"
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "at", "to", "for",
+    "and", "or", "what", "which", "who", "whom", "when", "where", "how", "do", "does", "did",
+    "i", "me", "my", "you", "your", "it", "its", "this", "that", "there", "can", "with", "about",
+}
+# Words with internal separators: course codes (CS-101), room numbers (B.204), amounts (45,000)
+_TOKEN_RE = re.compile(r"[0-9a-z]+(?:[-./,][0-9a-z]+)*")
+
+
+def analyze(text: str) -> List[str]:
+    """Lowercase alphanumeric terms; compound identifiers also yield their joined form"""
+    terms = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        parts = re.split(r"[-./,]", match)
+        terms.extend(part for part in parts if part not in _STOPWORDS)
+        if len(parts) > 1:
+            # "cs-101" is also indexed as "cs101", "45,000" as "45000"
+            terms.append("".join(parts))
+    return terms
+
+
+def document_key(doc: Document) -> str:
+    """Key for fusing results from different backends (not every backend returns IDs)"""
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+class KeywordIndex:
+    """BM25 inverted index over chunk text, kept in an SQLite FTS5 table.
+
+    Chunks are analyzed with analyze() before indexing so FTS5 only ever sees
+    plain alphanumeric terms, and queries go through the same analyzer.
+    Implements the same upsert/delete sink interface as the vector stores so
+    the ingestion pipeline can fill both at once.
+    """
+
+    def __init__(self, db_path=KEYWORD_INDEX_PATH):
+        self.db_path = db_path
+        self.create_tables()
+
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def create_tables(self):
+        with self.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    rowid INTEGER PRIMARY KEY,
+                    chunk_id TEXT UNIQUE NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    terms TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts
+                USING fts5(terms, content='chunks', content_rowid='rowid')
+            """)
+            # Keep the external-content FTS table in sync with chunks
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                    INSERT INTO chunks_fts(rowid, terms) VALUES (new.rowid, new.terms);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                    INSERT INTO chunks_fts(chunks_fts, rowid, terms) VALUES ('delete', old.rowid, old.terms);
+                END
+            """)
+            conn.commit()
+
+    def __len__(self):
+        with self.get_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    # ----------- Ingestion sink interface -----------
+    def upsert(self, records):
+        """Index a batch of (id, vector, text, metadata) records; vectors are ignored"""
+        rows = [
+            (chunk_id, text, json.dumps(metadata), " ".join(analyze(text)))
+            for chunk_id, _, text, metadata in records
+        ]
+        with self.get_connection() as conn:
+            conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(row[0],) for row in rows])
+            conn.executemany(
+                "INSERT INTO chunks (chunk_id, text, metadata, terms) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.commit()
+
+    def delete(self, ids):
+        with self.get_connection() as conn:
+            conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in ids])
+            conn.commit()
+
+    def optimize(self):
+        """Merge FTS5 segments after a large ingest"""
+        with self.get_connection() as conn:
+            conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('optimize')")
+            conn.commit()
+
+    # ----------- Search -----------
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Return (Document, BM25 score) pairs, best first"""
+        terms = list(dict.fromkeys(analyze(query)))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT c.chunk_id, c.text, c.metadata, bm25(chunks_fts) AS score
+                FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid
+                WHERE chunks_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+            """, (match, k)).fetchall()
+        # FTS5 bm25() is "lower is better"; flip it so higher is better like cosine
+        return [
+            (Document(id=chunk_id, page_content=text, metadata=json.loads(metadata)), -score)
+            for chunk_id, text, metadata, score in rows
+        ]
+
+
+def reciprocal_rank_fusion(result_lists, k: int = 60) -> List[Tuple[Document, float]]:
+    """Fuse ranked Document lists; each document scores sum(1 / (k + rank))"""
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = document_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [(docs[key], scores[key]) for key in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense + BM25 retriever fused with reciprocal rank fusion"""
+
+    vector_store: Any
+    keyword_index: Any
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        dense = self.vector_store.similarity_search(query, k=self.fetch_k)
+        sparse = [doc for doc, _ in self.keyword_index.search(query, k=self.fetch_k)]
+        fused = reciprocal_rank_fusion([dense, sparse], k=self.rrf_k)
+        return [doc for doc, _ in fused[:self.k]]
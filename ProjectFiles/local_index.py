@@ -0,0 +1,367 @@
+import os
+import json
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+LOCAL_INDEX_PATH = "local_index"
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# Popcount of every byte value, for Hamming distance on packed sign bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means, good enough for a coarse IVF quantizer"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+# ----------- Quantizers -----------
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-dimension int8 codes; returns (codes, scale)"""
+    scale = np.abs(vectors).max(axis=0) / 127.0 if len(vectors) else np.ones(vectors.shape[1])
+    scale = np.where(scale == 0, 1.0, scale).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, packed 8 per byte"""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _int8_scores(codes: np.ndarray, scale: np.ndarray, query: np.ndarray, block: int = 1024) -> np.ndarray:
+    # Fold the scale into the query so the codes are never dequantized in bulk;
+    # small blocks keep each float32 upcast inside the CPU cache
+    scaled_query = query * scale
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), block):
+        scores[start:start + block] = codes[start:start + block].astype(np.float32) @ scaled_query
+    return scores
+
+
+def _binary_scores(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    # Higher is better: negated Hamming distance between sign patterns
+    query_bits = np.packbits(query > 0)
+    if hasattr(np, "bitwise_count") and codes.shape[1] % 8 == 0:
+        # numpy >= 2: hardware popcount on 64-bit words
+        words = np.ascontiguousarray(codes).view(np.uint64)
+        return -np.bitwise_count(np.bitwise_xor(words, query_bits.view(np.uint64))).sum(axis=1, dtype=np.int32)
+    return -_POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1, dtype=np.int32)
+
+
+class LocalVectorIndex:
+    """In-process cosine index over a memory-mapped float32 matrix.
+
+    Files in the index directory:
+      vectors.npy    - N x dim float32, L2-normalized, loaded with mmap
+      docstore.json  - ids, texts and metadata in row order
+      ivf_*.npy      - optional IVF centroids / row order / list offsets
+
+      codes_*.npy    - optional int8 / binary codes for quantized search
+
+    Exact search is a single matrix-vector product. Once the index holds at
+    least ivf_min_size vectors, save() also trains an IVF quantizer so queries
+    only scan the nprobe closest lists.
+
+    With quantization="int8" or "binary" the first pass scores compact codes
+    held in memory (4x / 32x smaller than float32) and only the best
+    k * rescore_factor candidates are rescored against the full vectors,
+    which stay memory-mapped on disk.
+
+    upsert() stages vectors in memory as float32; once max_pending are staged
+    it calls save(), so ingestion holds at most max_pending new vectors
+    (~1.5 KB each at 384 dims) at a time. Each save() rewrites the whole
+    index, so keep max_pending large relative to a typical ingestion batch.
+    """
+
+    def __init__(self, path: str = LOCAL_INDEX_PATH, dimension: int = 384,
+                 ivf_min_size: int = 50_000, nprobe: int = 8,
+                 quantization: str = "none", rescore_factor: Optional[int] = None,
+                 max_pending: int = 50_000):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.path = path
+        self.dimension = dimension
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.quantization = quantization
+        # Sign bits are much coarser than int8, so they need a deeper rescoring pool
+        self._rescore_factor = rescore_factor
+        self.codes = None
+        self.code_scale = None
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.centroids = None
+        self.ivf_order = None
+        self.ivf_offsets = None
+        self._row_by_id = {}
+        self.max_pending = max_pending
+        self._pending = {}
+        self._deleted = set()
+        self._lock = threading.Lock()
+
+    # ----------- Persistence -----------
+    @classmethod
+    def load(cls, path: str = LOCAL_INDEX_PATH, mmap: bool = True, **kwargs) -> "LocalVectorIndex":
+        index = cls(path, **kwargs)
+        vectors_path = os.path.join(path, "vectors.npy")
+        if not os.path.exists(vectors_path):
+            return index
+        index.vectors = np.load(vectors_path, mmap_mode="r" if mmap else None)
+        index.dimension = index.vectors.shape[1]
+        with open(os.path.join(path, "docstore.json"), encoding="utf-8") as f:
+            docstore = json.load(f)
+        index.ids = docstore["ids"]
+        index.texts = docstore["texts"]
+        index.metadatas = docstore["metadatas"]
+        index._row_by_id = {vector_id: row for row, vector_id in enumerate(index.ids)}
+        centroids_path = os.path.join(path, "ivf_centroids.npy")
+        if os.path.exists(centroids_path):
+            index.centroids = np.load(centroids_path)
+            index.ivf_order = np.load(os.path.join(path, "ivf_order.npy"), mmap_mode="r" if mmap else None)
+            index.ivf_offsets = np.load(os.path.join(path, "ivf_offsets.npy"))
+        index._load_codes()
+        return index
+
+    def _codes_path(self, mode: str) -> str:
+        return os.path.join(self.path, f"codes_{mode}.npy")
+
+    def _load_codes(self):
+        if self.quantization == "none":
+            return
+        codes_path = self._codes_path(self.quantization)
+        if not os.path.exists(codes_path):
+            # Index was built without this mode; quantize once and keep it
+            self.set_quantization(self.quantization, persist=True)
+            return
+        self.codes = np.load(codes_path)
+        if self.quantization == "int8":
+            self.code_scale = np.load(os.path.join(self.path, "codes_int8_scale.npy"))
+
+    def set_quantization(self, mode: str, persist: bool = False):
+        """Switch quantization mode, (re)building codes from the stored vectors"""
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization: {mode}")
+        self.quantization = mode
+        self.codes = self.code_scale = None
+        if mode == "int8":
+            self.codes, self.code_scale = quantize_int8(np.asarray(self.vectors))
+        elif mode == "binary":
+            self.codes = quantize_binary(np.asarray(self.vectors))
+        if persist and mode != "none" and os.path.isdir(self.path):
+            np.save(self._codes_path(mode), self.codes)
+            if mode == "int8":
+                np.save(os.path.join(self.path, "codes_int8_scale.npy"), self.code_scale)
+
+    @property
+    def rescore_factor(self) -> int:
+        if self._rescore_factor is not None:
+            return self._rescore_factor
+        # binary recall@10 on MbuData.pdf chunks (LSA vectors): x10 0.74, x20 0.93 - see benchmarks.py quantization
+        return 20 if self.quantization == "binary" else 4
+
+    @rescore_factor.setter
+    def rescore_factor(self, value: Optional[int]):
+        """None restores the per-mode default"""
+        self._rescore_factor = value
+
+    def memory_bytes(self) -> int:
+        """Bytes that have to be resident for the first search pass"""
+        if self.codes is not None:
+            return self.codes.nbytes
+        return self.vectors.size * self.vectors.itemsize
+
+    def save(self):
+        """Apply pending upserts/deletes and rewrite the index files"""
+        with self._lock:
+            keep = [row for row, vector_id in enumerate(self.ids)
+                    if vector_id not in self._deleted and vector_id not in self._pending]
+            ids = [self.ids[row] for row in keep]
+            texts = [self.texts[row] for row in keep]
+            metadatas = [self.metadatas[row] for row in keep]
+            blocks = [np.asarray(self.vectors[keep], dtype=np.float32)] if keep else []
+            if self._pending:
+                new_ids = list(self._pending)
+                ids.extend(new_ids)
+                texts.extend(self._pending[i][1] for i in new_ids)
+                metadatas.extend(self._pending[i][2] for i in new_ids)
+                blocks.append(_normalize(np.asarray([self._pending[i][0] for i in new_ids], dtype=np.float32)))
+            vectors = np.concatenate(blocks) if blocks else np.zeros((0, self.dimension), dtype=np.float32)
+
+            os.makedirs(self.path, exist_ok=True)
+            # Write to temp names first so a crash never leaves a half-written index
+            tmp_vectors = os.path.join(self.path, "vectors.tmp.npy")
+            np.save(tmp_vectors, vectors)
+            tmp_docstore = os.path.join(self.path, "docstore.tmp.json")
+            with open(tmp_docstore, "w", encoding="utf-8") as f:
+                json.dump({"ids": ids, "texts": texts, "metadatas": metadatas}, f)
+            # Swap in the in-memory matrix before replacing the mmapped file
+            self.vectors = vectors
+            os.replace(tmp_vectors, os.path.join(self.path, "vectors.npy"))
+            os.replace(tmp_docstore, os.path.join(self.path, "docstore.json"))
+            self._write_ivf(vectors)
+            for mode in QUANTIZATION_MODES[1:]:
+                # Codes for other modes are stale now; they get rebuilt on load
+                if mode != self.quantization and os.path.exists(self._codes_path(mode)):
+                    os.remove(self._codes_path(mode))
+            self.set_quantization(self.quantization, persist=True)
+
+            self.ids, self.texts, self.metadatas = ids, texts, metadatas
+            self._row_by_id = {vector_id: row for row, vector_id in enumerate(ids)}
+            self._pending = {}
+            self._deleted = set()
+
+    def _write_ivf(self, vectors: np.ndarray):
+        names = ("ivf_centroids.npy", "ivf_order.npy", "ivf_offsets.npy")
+        if len(vectors) < self.ivf_min_size:
+            for name in names:
+                if os.path.exists(os.path.join(self.path, name)):
+                    os.remove(os.path.join(self.path, name))
+            self.centroids = self.ivf_order = self.ivf_offsets = None
+            return
+        n_lists = int(np.sqrt(len(vectors)))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), 50 * n_lists), replace=False)]
+        centroids = _kmeans(sample, n_lists)
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 65536):
+            block = vectors[start:start + 65536]
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]).astype(np.int64)
+        for name, array in zip(names, (centroids, order, offsets)):
+            np.save(os.path.join(self.path, name), array)
+        self.centroids, self.ivf_order, self.ivf_offsets = centroids, order, offsets
+
+    # ----------- Ingestion sink interface -----------
+    def upsert(self, records):
+        """Stage a batch of (id, vector, text, metadata) records; call save() to persist"""
+        with self._lock:
+            for vector_id, values, text, metadata in records:
+                self._pending[vector_id] = (np.asarray(values, dtype=np.float32), text, dict(metadata))
+                self._deleted.discard(vector_id)
+            flush = len(self._pending) >= self.max_pending
+        if flush:
+            self.save()
+
+    def delete(self, ids):
+        with self._lock:
+            for vector_id in ids:
+                self._pending.pop(vector_id, None)
+                if vector_id in self._row_by_id:
+                    self._deleted.add(vector_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ----------- Search -----------
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if self.centroids is None:
+            return None
+        nprobe = min(self.nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.ivf_order[self.ivf_offsets[c]:self.ivf_offsets[c + 1]] for c in lists])
+
+    def search(self, query_vector, k: int = 4, exact: bool = False) -> List[Tuple[int, float]]:
+        """Return (row, cosine score) pairs, best first"""
+        if len(self.ids) == 0:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        rows = None if exact else self._candidate_rows(query)
+        if rows is not None:
+            rows = np.sort(rows)
+
+        if self.codes is not None and not exact:
+            # First pass over the compact codes, then exact rescoring
+            codes = self.codes if rows is None else self.codes[rows]
+            if self.quantization == "int8":
+                approx = _int8_scores(codes, self.code_scale, query)
+            else:
+                approx = _binary_scores(codes, query)
+            n_candidates = min(len(approx), k * self.rescore_factor)
+            best = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+            rows = np.sort(best if rows is None else rows[best])
+
+        if rows is None:
+            scores = self.vectors @ query
+            rows = np.arange(len(scores))
+        else:
+            scores = self.vectors[rows] @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def document(self, row: int) -> Document:
+        return Document(page_content=self.texts[row], metadata=dict(self.metadatas[row]))
+
+
+class LocalVectorStore(VectorStore):
+    """LangChain VectorStore over a LocalVectorIndex, usable via as_retriever()"""
+
+    def __init__(self, index: LocalVectorIndex, embedding: Embeddings):
+        self.index = index
+        self._embedding = embedding
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @classmethod
+    def from_existing_index(cls, embedding: Embeddings, path: str = LOCAL_INDEX_PATH, **kwargs):
+        return cls(LocalVectorIndex.load(path, **kwargs), embedding)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(len(self.index) + len(self.index._pending) + i) for i in range(len(texts))]
+        vectors = self._embedding.embed_documents(texts)
+        self.index.upsert(list(zip(ids, vectors, texts, metadatas)))
+        self.index.save()
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   path: str = LOCAL_INDEX_PATH, **kwargs) -> "LocalVectorStore":
+        store = cls(LocalVectorIndex.load(path), embedding)
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        return [(self.index.document(row), score) for row, score in self.index.search(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
@@ -0,0 +1,121 @@
+import json
+import sqlite3
+import hashlib
+from typing import Dict, List, Optional
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionPlan:
+    """What an incremental run has to do for a set of files"""
+
+    def __init__(self):
+        self.unchanged: List[str] = []
+        self.new: List[str] = []
+        self.changed: List[str] = []
+        self.removed: List[str] = []
+        self.hashes: Dict[str, str] = {}
+
+    @property
+    def to_ingest(self) -> List[str]:
+        return self.new + self.changed
+
+    def summary(self) -> str:
+        return (f"{len(self.unchanged)} unchanged, {len(self.new)} new, "
+                f"{len(self.changed)} changed, {len(self.removed)} removed")
+
+
+class IngestionManifest:
+    """Persistent record of which files have been embedded and with what settings"""
+
+    def __init__(self, db_path="ingestion_manifest.sqlite"):
+        self.db_path = db_path
+        self.create_tables()
+
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_tables(self):
+        with self.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingested_files (
+                    path TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    chunk_size INTEGER NOT NULL,
+                    chunk_overlap INTEGER NOT NULL,
+                    embedding_model TEXT NOT NULL,
+                    vector_ids TEXT NOT NULL,
+                    ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+
+    def get_entry(self, path: str) -> Optional[dict]:
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT * FROM ingested_files WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return None
+            entry = dict(row)
+            entry["vector_ids"] = json.loads(entry["vector_ids"])
+            return entry
+
+    def all_paths(self) -> List[str]:
+        with self.get_connection() as conn:
+            return [row[0] for row in conn.execute("SELECT path FROM ingested_files")]
+
+    def plan(self, paths, chunk_size: int, chunk_overlap: int, embedding_model: str) -> IngestionPlan:
+        """Compare files on disk against the manifest"""
+        plan = IngestionPlan()
+        on_disk = set()
+        for path in paths:
+            on_disk.add(path)
+            content_hash = hash_file(path)
+            plan.hashes[path] = content_hash
+            entry = self.get_entry(path)
+            if entry is None:
+                plan.new.append(path)
+            elif (entry["content_hash"] == content_hash
+                  and entry["chunk_size"] == chunk_size
+                  and entry["chunk_overlap"] == chunk_overlap
+                  and entry["embedding_model"] == embedding_model):
+                plan.unchanged.append(path)
+            else:
+                plan.changed.append(path)
+        plan.removed = [path for path in self.all_paths() if path not in on_disk]
+        return plan
+
+    def version(self) -> str:
+        """Fingerprint of the ingested corpus; changes whenever any file is (re)ingested or removed"""
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT path, content_hash, chunk_size, chunk_overlap, embedding_model
+                FROM ingested_files ORDER BY path
+            """).fetchall()
+        digest = hashlib.sha256()
+        for row in rows:
+            digest.update("|".join(str(value) for value in row).encode("utf-8"))
+        return digest.hexdigest()
+
+    def record(self, path: str, content_hash: str, chunk_size: int, chunk_overlap: int,
+               embedding_model: str, vector_ids: List[str]):
+        with self.get_connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO ingested_files
+                    (path, content_hash, chunk_size, chunk_overlap, embedding_model, vector_ids, ingested_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (path, content_hash, chunk_size, chunk_overlap, embedding_model, json.dumps(vector_ids)))
+            conn.commit()
+
+    def remove(self, path: str):
+        with self.get_connection() as conn:
+            conn.execute("DELETE FROM ingested_files WHERE path = ?", (path,))
+            conn.commit()
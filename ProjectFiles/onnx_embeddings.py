@@ -0,0 +1,132 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = "onnx_models"
+# "torch" (HuggingFaceEmbeddings), "onnx" or "onnx-int8"
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _model_dir(model_name: str, root: str = ONNX_MODEL_DIR) -> str:
+    return os.path.join(root, model_name.split("/")[-1])
+
+
+def export_onnx_model(model_name: str = EMBEDDING_MODEL_NAME, root: str = ONNX_MODEL_DIR) -> str:
+    """One-time export of a sentence-transformers model to ONNX (+ dynamic int8 copy).
+
+    Needs torch and transformers; serving the exported files afterwards only
+    needs onnxruntime and tokenizers.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir = _model_dir(model_name, root)
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(out_dir)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            os.path.join(out_dir, "model.onnx"),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(
+        os.path.join(out_dir, "model.onnx"),
+        os.path.join(out_dir, "model_int8.onnx"),
+        weight_type=QuantType.QInt8,
+    )
+    print(f"✅ Exported {model_name} to {out_dir}")
+    return out_dir
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers style (mean pooled) embeddings served by ONNX Runtime"""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, quantized: bool = False,
+                 normalize: bool = True, batch_size: int = 32, max_length: int = 256,
+                 root: str = ONNX_MODEL_DIR, threads: int = 0):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise ImportError("ONNX backend needs 'pip install onnxruntime tokenizers'")
+
+        model_dir = _model_dir(model_name, root)
+        model_file = os.path.join(model_dir, "model_int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(model_file):
+            export_onnx_model(model_name, root)
+
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        inputs = {name: value for name, value in inputs.items() if name in self.input_names}
+        hidden = self.session.run(None, inputs)[0]
+
+        # Mean pooling over real (non-padding) tokens, as sentence-transformers does
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def create_embeddings(backend: str = "torch", model_name: str = EMBEDDING_MODEL_NAME,
+                      normalize: bool = True, batch_size: int = 32, device: Optional[str] = "cpu") -> Embeddings:
+    """Build the embedding model for the selected backend (torch is only imported for "torch")"""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+    if backend == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': device} if device else {},
+            encode_kwargs={'normalize_embeddings': normalize, 'batch_size': batch_size}
+        )
+    return OnnxEmbeddings(model_name, quantized=backend == "onnx-int8",
+                          normalize=normalize, batch_size=batch_size)
+
+
+def cache_model_name(backend: str, model_name: str = EMBEDDING_MODEL_NAME) -> str:
+    """Embedding cache key: vectors from different backends are close, not identical"""
+    return model_name if backend == "torch" else f"{model_name}#{backend}"
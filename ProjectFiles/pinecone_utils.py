@@ -1,100 +1,231 @@
 import os
+import sys
+import hashlib
 from dotenv import load_dotenv
 
 from langchain_community.document_loaders import (
     PyMuPDFLoader,
     UnstructuredWordDocumentLoader,
     UnstructuredHTMLLoader,
-    TextLoader,
 )
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_pinecone import PineconeVectorStore
 from pinecone import Pinecone, ServerlessSpec
 
-# ----------- Loaders for each file type -----------
-def load_pdf_document(path: str):
-    return PyMuPDFLoader(path).load()
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 20
 
-def load_docx_document(path: str):
-    return UnstructuredWordDocumentLoader(path).load()
+# ----------- Streaming (block-at-a-time) loading -----------
+# Upper bound on the text held for one file before it is split into chunks
+BLOCK_CHARS = 4000
 
-def load_html_document(path: str):
-    return UnstructuredHTMLLoader(path).load()
-
-def load_txt_document(path: str):
-    return TextLoader(path, encoding="utf-8").load()
-
-# ----------- Detect file type & load -----------
-def load_document(path: str):
+def get_loader(path: str):
     ext = os.path.splitext(path)[1].lower()
     if ext == ".pdf":
-        return load_pdf_document(path)
+        return PyMuPDFLoader(path)
     elif ext == ".docx":
-        return load_docx_document(path)
+        # "elements" yields one Document per paragraph/title/table instead of the whole file
+        return UnstructuredWordDocumentLoader(path, mode="elements")
     elif ext in [".html", ".htm"]:
-        return load_html_document(path)
-    elif ext == ".txt":
-        return load_txt_document(path)
+        return UnstructuredHTMLLoader(path, mode="elements")
     else:
         raise ValueError(f"Unsupported file type: {ext}")
 
+def iter_text_blocks(path: str, max_chars: int = BLOCK_CHARS):
+    """Yield a .txt file as Documents of whole paragraphs packed up to about max_chars, read line by line"""
+    lines, size, first_line = [], 0, 1
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if line.strip():
+                if not lines:
+                    first_line = line_number
+                lines.append(line)
+                size += len(line)
+            elif lines:
+                lines.append(line)
+            # Cut at a paragraph break once the block is full (or mid-paragraph if one runs far over)
+            if size >= max_chars and (not line.strip() or size >= 2 * max_chars):
+                yield Document(page_content="".join(lines).strip(), metadata={"source": path, "line": first_line})
+                lines, size = [], 0
+    if lines:
+        yield Document(page_content="".join(lines).strip(), metadata={"source": path, "line": first_line})
+
+def merge_elements(elements, path: str, max_chars: int = BLOCK_CHARS):
+    """Join consecutive Unstructured elements into blocks of up to max_chars.
+
+    Only source, page and the block's position in the file are kept:
+    element metadata holds nested values Pinecone cannot store, and tiny
+    per-element chunks would hurt retrieval.
+    """
+    texts, size, page, block = [], 0, None, 0
+
+    def flush():
+        metadata = {"source": path, "block": block}
+        if page is not None:
+            metadata["page"] = page
+        return Document(page_content="\n\n".join(texts), metadata=metadata)
+
+    for element in elements:
+        element_page = element.metadata.get("page_number")
+        if texts and (size + len(element.page_content) > max_chars or element_page != page):
+            yield flush()
+            texts, size, block = [], 0, block + 1
+        texts.append(element.page_content)
+        size += len(element.page_content)
+        page = element_page
+    if texts:
+        yield flush()
+
+def lazy_load_document(path: str):
+    """Yield Documents a page (PDF) or bounded block (DOCX, HTML, TXT) at a time"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".txt":
+        yield from iter_text_blocks(path)
+    elif ext == ".pdf":
+        yield from get_loader(path).lazy_load()
+    else:
+        yield from merge_elements(get_loader(path).lazy_load(), path)
+
 # ----------- Create chunks -----------
-def create_chunks(documents, chunk_size=500, chunk_overlap=20):
+def iter_chunks(documents, chunk_size=500, chunk_overlap=20):
+    """Split a stream of Documents lazily, one page at a time"""
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
     )
-    return text_splitter.split_documents(documents)
+    for document in documents:
+        yield from text_splitter.split_documents([document])
+
+def iter_chunk_batches(path: str, batch_size=64, chunk_size=500, chunk_overlap=20):
+    """Stream a file as lists of at most batch_size chunks"""
+    batch = []
+    for chunk in iter_chunks(lazy_load_document(path), chunk_size, chunk_overlap):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ----------- Stable chunk IDs -----------
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def make_chunk_id(chunk, source: str = None) -> str:
+    """Deterministic vector ID from source, page, block position, offset and text hash"""
+    metadata = chunk.metadata
+    source = source or metadata.get("source", "")
+    parts = [
+        os.path.normpath(source),
+        str(metadata.get("page", "")),
+        str(metadata.get("start_index", "")),
+        text_hash(chunk.page_content),
+    ]
+    # start_index counts from the start of each block, so TXT and DOCX/HTML blocks also
+    # need their position; PDF chunks have neither key and keep their existing IDs
+    for position in ("line", "block"):
+        if position in metadata:
+            parts.append(f"{position}={metadata[position]}")
+    key = "|".join(parts)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
 
 
 
 # ----------- MAIN PIPELINE -----------
 if __name__ == "__main__":
     load_dotenv()
-    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-    if not PINECONE_API_KEY:
-        raise ValueError("❌ Pinecone API Key not found in .env file")
+    # "pinecone" (default) or "local" for the in-process index in local_index.py
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+    # "torch", "onnx" or "onnx-int8"
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
     
-    # Initialize Pinecone
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    INDEX_NAME = "langchain-pinecone-demo"
+    from ingestion import MultiSink, PineconeSink, sync_folder
+    from manifest import IngestionManifest
+    from embedding_cache import CachedEmbeddings
+    from keyword_index import KeywordIndex
+    from onnx_embeddings import cache_model_name, create_embeddings
     
-    # Check if index exists, else create
-    if INDEX_NAME not in [idx["name"] for idx in pc.list_indexes()]:
-        pc.create_index(
-            name=INDEX_NAME,
-            metric="cosine",
-            dimension=384,  # must match embedding model
-            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+    if VECTOR_BACKEND == "local":
+        from local_index import LocalVectorIndex, LOCAL_INDEX_PATH
+        
+        # "none", "int8" or "binary" quantized codes for the first search pass
+        sink = LocalVectorIndex.load(
+            LOCAL_INDEX_PATH, quantization=os.getenv("LOCAL_INDEX_QUANTIZATION", "none")
         )
-        print(f"✅ Created index: {INDEX_NAME}")
+        # The manifest lives next to the index it describes
+        os.makedirs(LOCAL_INDEX_PATH, exist_ok=True)
+        manifest = IngestionManifest(os.path.join(LOCAL_INDEX_PATH, "manifest.sqlite"))
+        print(f"ℹ Using local index at '{LOCAL_INDEX_PATH}' ({len(sink)} vectors)")
     else:
-        print(f"ℹ Index '{INDEX_NAME}' already exists.")
+        PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+        if not PINECONE_API_KEY:
+            raise ValueError("❌ Pinecone API Key not found in .env file")
+        
+        # Initialize Pinecone
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+        INDEX_NAME = "langchain-pinecone-demo"
+        
+        # One-off compaction: python pinecone_utils.py dedup [--dry-run]
+        if len(sys.argv) > 1 and sys.argv[1] == "dedup":
+            from ingestion import dedup_index
+            
+            dry_run = "--dry-run" in sys.argv
+            removed = dedup_index(pc.Index(INDEX_NAME), dry_run=dry_run)
+            verb = "Would remove" if dry_run else "Removed"
+            print(f"🧹 {verb} {removed} duplicate vectors from '{INDEX_NAME}'")
+            sys.exit(0)
+        
+        # Check if index exists, else create
+        if INDEX_NAME not in [idx["name"] for idx in pc.list_indexes()]:
+            pc.create_index(
+                name=INDEX_NAME,
+                metric="cosine",
+                dimension=384,  # must match embedding model
+                spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+            )
+            print(f"✅ Created index: {INDEX_NAME}")
+        else:
+            print(f"ℹ Index '{INDEX_NAME}' already exists.")
+        
+        sink = PineconeSink(pc.Index(INDEX_NAME))
+        manifest = IngestionManifest()
     
-    # Embedding model
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    # Embedding model, backed by the on-disk embedding cache. Switching backend
+    # changes the recorded model name, so the manifest re-embeds everything.
+    embedding_model = cache_model_name(EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME)
+    embeddings = CachedEmbeddings(
+        create_embeddings(EMBEDDING_BACKEND, model_name=EMBEDDING_MODEL_NAME, normalize=False, device=None),
+        model_name=embedding_model,
+        normalize=False,
+    )
     
-    # Process files from local data folder
+    # Process new/changed files from local data folder through the staged pipeline
     data_folder = "pinecone"
-    for file_name in os.listdir(data_folder):
-        file_path = os.path.join(data_folder, file_name)
-        try:
-            docs = load_document(file_path)
-            print(f"✅ Loaded {file_name}, total {len(docs)} docs")
-            
-            # Create chunks
-            chunks = create_chunks(docs)
-            print(f"📄 Split into {len(chunks)} chunks")
-            
-            # Insert into Pinecone via LangChain
-            PineconeVectorStore.from_documents(
-                documents=chunks,
-                embedding=embeddings,
-                index_name=INDEX_NAME
-            )
-            print(f"🚀 Inserted {len(chunks)} chunks from {file_name} into Pinecone")
-        except Exception as e:
-            print(f"❌ Could not process {file_name}: {e}")
+    paths = [os.path.join(data_folder, file_name) for file_name in sorted(os.listdir(data_folder))]
+    
+    # BM25 inverted index for hybrid retrieval, filled alongside the vectors
+    keyword_index = KeywordIndex()
+    rebuild = len(keyword_index) == 0 and bool(manifest.all_paths())
+    if rebuild:
+        print("ℹ Keyword index is empty, re-ingesting all files to build it")
+    
+    stats = sync_folder(
+        paths,
+        embeddings=embeddings,
+        sink=MultiSink(sink, keyword_index),
+        manifest=manifest,
+        embedding_model=embedding_model,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        force=rebuild,
+    )
+    keyword_index.optimize()
+    if VECTOR_BACKEND == "local":
+        # sync_folder already saved the index before recording the manifest
+        print(f"🚀 Inserted {stats['vectors']} chunks from {stats['files']} files into the local index")
+    else:
+        print(f"🚀 Inserted {stats['vectors']} chunks from {stats['files']} files into Pinecone")
     
-    
\ No newline at end of file
+    cache_stats = embeddings.stats()
+    print(f"💾 Embedding cache: {cache_stats['hit_rate']:.1%} hit rate "
+          f"({cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries)")
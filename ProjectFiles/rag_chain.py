@@ -0,0 +1,235 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain.chains import create_retrieval_chain
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
+
+from history_window import count_tokens
+from system_template import SYSTEM_TEMPLATE
+
+# "always": rewrite every follow-up with the LLM (original behaviour)
+# "skip": rewrite only when the question looks like it depends on the history
+# "parallel": like "skip", and retrieve on a guess of the rewritten question while the rewrite runs
+REWRITE_MODES = ("always", "skip", "parallel")
+
+CONTEXTUALIZE_Q_SYSTEM_PROMPT = """Given a chat history and the latest user question \
+which might reference context in the chat history, formulate a standalone question \
+which can be understood without the chat history. Do NOT answer the question, \
+just reformulate it if needed and otherwise return it as is."""
+
+# Words and openers that usually point back at an earlier turn
+_REFERENCE_WORDS = {
+    "it", "its", "they", "them", "their", "theirs", "this", "that", "these", "those",
+    "he", "him", "his", "she", "her", "hers", "there", "same", "above", "previous",
+    "former", "latter", "one", "ones", "else", "more", "again",
+}
+_FOLLOW_UP_OPENERS = ("and ", "also ", "what about", "how about", "then ", "but ", "so ", "why not")
+# Question scaffolding that says nothing about the topic being asked about
+_FUNCTION_WORDS = {
+    "what", "what's", "which", "who", "when", "where", "why", "how", "is", "are", "was", "were", "be",
+    "do", "does", "did", "can", "could", "would", "should", "will", "shall", "may", "might", "must",
+    "the", "a", "an", "of", "to", "in", "on", "for", "and", "or", "with", "about", "at", "by", "from",
+    "i", "i'm", "me", "my", "we", "our", "you", "your", "please", "tell", "explain", "know", "now",
+    "next", "then", "so", "also", "too", "just", "any", "some", "much", "many", "all", "not", "no",
+}
+_WORD_RE = re.compile(r"[a-z']+")
+
+_rewrite_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rewrite")
+
+
+def _last_user_message(chat_history):
+    for message in reversed(chat_history or []):
+        if getattr(message, "type", None) == "human":
+            return message.content
+    return None
+
+
+def is_standalone_question(question: str, chat_history, embeddings=None,
+                           similarity_threshold: float = 0.6) -> bool:
+    """Cheap local check for whether a question can be answered without the history.
+
+    A question is treated as a follow-up if it is very short, opens like a
+    continuation ("and the fees?") or uses a pronoun/reference word. One with
+    no content words of its own ("what should I do now?") is a follow-up
+    when - with embeddings - it is very close to the previous user turn.
+    Questions that name their topic stay standalone even when they repeat
+    the previous turn, so asking again does not pay for a rewrite.
+    """
+    if not chat_history:
+        return True
+    text = question.strip().lower()
+    words = _WORD_RE.findall(text)
+    if len(words) < 3 or text.startswith(_FOLLOW_UP_OPENERS):
+        return False
+    if any(word in _REFERENCE_WORDS for word in words):
+        return False
+    if any(word not in _FUNCTION_WORDS for word in words):
+        return True
+    previous = _last_user_message(chat_history)
+    if embeddings is not None and previous:
+        return _similarity(question, previous, embeddings) < similarity_threshold
+    return True
+
+
+def _similarity(a: str, b: str, embeddings) -> float:
+    a_vec, b_vec = (np.asarray(v, dtype=np.float32) for v in embeddings.embed_documents([a, b]))
+    norms = np.linalg.norm(a_vec) * np.linalg.norm(b_vec)
+    return float(a_vec @ b_vec) / norms if norms else 0.0
+
+
+def _same_question(a: str, b: str, embeddings=None, similarity_threshold: float = 0.8) -> bool:
+    """Whether documents retrieved for one question also serve the other"""
+    normalize = lambda text: " ".join(_WORD_RE.findall(text.lower()))
+    if normalize(a) == normalize(b):
+        return True
+    return embeddings is not None and _similarity(a, b, embeddings) >= similarity_threshold
+
+
+def build_rag_chain(chat, retriever, answer_cache=None, rewrite_mode: str = "skip", embeddings=None,
+                    history_window=None):
+    """Build the conversational RAG chain.
+
+    Input: {"input", "chat_history"}. Output adds "standalone_question",
+    "context", "answer", plus "cache_hit" when the answer came from
+    answer_cache and "rewrite_skipped" when no rewrite LLM call was made.
+    Standalone questions (rewrite skipped) are answered without the chat
+    history and report "cacheable": True, i.e. the answer may be stored in
+    the shared answer_cache; rewritten follow-ups keep the history.
+    With a history_window, chat_history is cut down to its window (keyed by
+    the configurable session_id) and "history_tokens" reports
+    (full, windowed) prompt tokens of the history.
+    """
+    if rewrite_mode not in REWRITE_MODES:
+        raise ValueError(f"Unsupported rewrite mode: {rewrite_mode}")
+
+    contextualize_q_prompt = ChatPromptTemplate.from_messages([
+        ("system", CONTEXTUALIZE_Q_SYSTEM_PROMPT),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+    ])
+    rewrite_chain = contextualize_q_prompt | chat | StrOutputParser()
+
+    def window_history(inputs, config):
+        """Replace the full history with the token-budgeted window"""
+        history = inputs.get("chat_history") or []
+        if history_window is None or not history:
+            return inputs
+        session_id = config.get("configurable", {}).get("session_id")
+        window = history_window.apply(session_id, history)
+        tokens = (count_tokens(history, chat), count_tokens(window, chat))
+        return {**inputs, "chat_history": window, "history_tokens": tokens}
+
+    def contextualize(inputs):
+        """Produce the standalone question, skipping or overlapping the rewrite call"""
+        question = inputs["input"]
+        history = inputs.get("chat_history")
+        if not history:
+            return {"standalone_question": question, "rewrite_skipped": True}
+        if rewrite_mode != "always" and is_standalone_question(question, history, embeddings):
+            return {"standalone_question": question, "rewrite_skipped": True}
+        if rewrite_mode != "parallel":
+            return {"standalone_question": rewrite_chain.invoke(inputs), "rewrite_skipped": False}
+
+        # Only follow-ups get here, so speculatively retrieve on the question joined to the
+        # previous user turn - roughly what the rewrite produces - while the LLM rewrites it
+        previous = _last_user_message(history)
+        guess = f"{previous} {question}" if previous else question
+        speculative = _rewrite_pool.submit(retriever.invoke, guess)
+        rewritten = rewrite_chain.invoke(inputs)
+        result = {"standalone_question": rewritten, "rewrite_skipped": False}
+        if _same_question(rewritten, guess, embeddings) or _same_question(rewritten, question):
+            result["prefetched_context"] = speculative.result()
+        else:
+            speculative.cancel()
+        return result
+
+    def retrieve(inputs):
+        if "prefetched_context" in inputs:
+            return inputs["prefetched_context"]
+        return retriever.invoke(inputs["standalone_question"])
+
+    # Modify the system template
+    modified_system_template = SYSTEM_TEMPLATE.replace(
+        "- Legal Disclaimer",
+        "❖ Legal Disclaimer"
+    ).replace(
+        "{context}",
+        "*Context from retrieved documents:*\n{context}"
+    )
+
+    # Create QA prompt
+    qa_prompt = ChatPromptTemplate.from_messages([
+        ("system", modified_system_template),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+    ])
+
+    # Create document chain
+    question_answer_chain = create_stuff_documents_chain(chat, qa_prompt)
+
+    # Create RAG chain
+    rag_chain = create_retrieval_chain(RunnableLambda(retrieve), question_answer_chain)
+
+    def answer_from_cache_or_rag(inputs):
+        """Serve near-duplicate questions from the answer cache, else run retrieval + QA"""
+        cached = answer_cache.lookup(inputs["standalone_question"]) if answer_cache else None
+        if cached is not None:
+            return {**inputs, "context": [], "answer": cached, "cache_hit": True}
+        return rag_chain
+
+    def separate_standalone(inputs):
+        # answer_cache is shared by all users, but the history and rolling summary in the QA prompt
+        # can make an answer personal ("as you mentioned, your branch is..."). Questions that need
+        # no rewrite are answered without them, so their answers can be shared; follow-ups keep
+        # the history and are never cached. Every user has one long-lived session, so caching
+        # only history-free prompts would store little more than each user's first question.
+        if not inputs.get("rewrite_skipped"):
+            return {**inputs, "cacheable": False}
+        inputs = {**inputs, "chat_history": [], "cacheable": True}
+        if "history_tokens" in inputs:
+            inputs["history_tokens"] = (inputs["history_tokens"][0], 0)
+        return inputs
+
+    return (
+        RunnableLambda(window_history)
+        | RunnableLambda(lambda x: {**x, **contextualize(x)})
+        | RunnableLambda(separate_standalone)
+        | RunnableLambda(answer_from_cache_or_rag)
+    )
+
+
+def stream_answer(chain, inputs, config=None, output=None, timings=None):
+    """Yield answer tokens as they arrive.
+
+    The other output keys are collected into output, and "ttft_ms" / "total_ms"
+    are written to timings once the stream is exhausted.
+    """
+    output = {} if output is None else output
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    first = None
+    for chunk in chain.stream(inputs, config=config):
+        for key, value in chunk.items():
+            if key != "answer":
+                output[key] = value
+            elif isinstance(value, str) and value:
+                if first is None:
+                    first = time.perf_counter()
+                output["answer"] = output.get("answer", "") + value
+                yield value
+    end = time.perf_counter()
+    timings["ttft_ms"] = ((first or end) - start) * 1000
+    timings["total_ms"] = (end - start) * 1000
+
+
+def time_to_first_token(chain, inputs, config=None):
+    """Stream the chain once; return (ms to first answer token, total ms, output)"""
+    output, timings = {}, {}
+    for _ in stream_answer(chain, inputs, config, output, timings):
+        pass
+    return timings["ttft_ms"], timings["total_ms"], output